@@ -0,0 +1,56 @@
+import os
+import pygame as pg
+
+
+def surface_bytes(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+class AssetRegistry:
+    def __init__(self):
+        self.images = {}
+        self.frames = {}
+        self.scaled_frames = {}
+        self.textures = {}
+
+    def get_image(self, path):
+        image = self.images.get(path)
+        if image is None:
+            image = self.images[path] = pg.image.load(path).convert_alpha()
+        return image
+
+    def get_frames(self, path):
+        # every image file of an animation folder, decoded once and shared by all instances
+        frames = self.frames.get(path)
+        if frames is None:
+            frames = self.frames[path] = tuple(
+                self.get_image(path + '/' + file_name) for file_name in sorted(os.listdir(path))
+                if os.path.isfile(os.path.join(path, file_name))
+            )
+        return frames
+
+    def get_scaled_frames(self, path, scale):
+        key = path, scale
+        frames = self.scaled_frames.get(key)
+        if frames is None:
+            frames = self.scaled_frames[key] = tuple(
+                pg.transform.smoothscale(img, (img.get_width() * scale, img.get_height() * scale))
+                for img in self.get_frames(path)
+            )
+        return frames
+
+    def get_texture(self, path, res):
+        key = path, tuple(res)
+        texture = self.textures.get(key)
+        if texture is None:
+            texture = self.textures[key] = pg.transform.scale(self.get_image(path), res)
+        return texture
+
+    def clear(self):
+        self.images.clear()
+        self.frames.clear()
+        self.scaled_frames.clear()
+        self.textures.clear()
+
+
+assets = AssetRegistry()
@@ -104,11 +104,11 @@ class PlayerAssistant:
             self.advice = "Assistant deactivated."
             self.target_indicator = False
             self.current_target = None
-        self.advice_time = pg.time.get_ticks()
+        self.advice_time = self.game.get_ticks()
     
     def update(self):
         """Update the assistant's analysis and advice"""
-        current_time = pg.time.get_ticks()
+        current_time = self.game.get_ticks()
         
         # Only analyze if active and cooldown has passed
         if self.active and current_time - self.last_analysis_time > self.analysis_cooldown:
@@ -164,22 +164,8 @@ class PlayerAssistant:
     
     def is_npc_hidden(self, npc, player):
         """Check if NPC is behind a wall from player's perspective"""
-        # Simple ray casting to check if there's a wall between player and NPC
-        dx = npc.x - player.x
-        dy = npc.y - player.y
-        distance = math.hypot(dx, dy)
-        
-        # Check a few points along the line between player and NPC
-        steps = min(10, int(distance * 2))  # More steps for longer distances
-        for i in range(1, steps):
-            check_x = player.x + dx * i / steps
-            check_y = player.y + dy * i / steps
-            
-            # If there's a wall at this grid cell, the NPC is hidden
-            if (int(check_x), int(check_y)) in self.game.map.world_map:
-                return True
-                
-        return False
+        # Line of sight is cast once per step for all NPCs by the visibility service
+        return not self.game.visibility.is_visible(npc)
     
     def get_relative_position(self, npc, player):
         """Get the relative position (direction) of an NPC from the player's perspective"""
@@ -197,7 +183,7 @@ class PlayerAssistant:
     def analyze_situation(self):
         """Analyze the current game state and determine advice to give"""
         player = self.game.player
-        npc_list = self.game.object_handler.npc_list
+        npc_index = self.game.object_handler.npc_index
     
     # Feature extraction - these could be inputs to a ML model
         player_health = player.health / PLAYER_MAX_HEALTH  # normalized health
@@ -206,7 +192,9 @@ class PlayerAssistant:
         if player.health < 30:
             self.advice = "WARNING: Health critical! Find cover and recover."
             self.advice_color = (255, 0, 0)  # red for critical
-            self.advice_time = pg.time.get_ticks()
+            self.advice_time = self.game.get_ticks()
+            # positions are not tracked meanwhile, a later comparison would report stale movement
+            self.last_positions.clear()
             return
         
     # Count nearby threats and calculate features
@@ -215,9 +203,8 @@ class PlayerAssistant:
         hidden_enemies = []
         moving_enemies = []
     
-        for npc in npc_list:
+        for npc, distance in npc_index.query_radius(player.x, player.y, 7):
             if npc.alive:
-                distance = math.hypot(player.x - npc.x, player.y - npc.y)
             # Calculate if NPC is in player's field of view
                 dx = npc.x - player.x
                 dy = npc.y - player.y
@@ -251,6 +238,11 @@ class PlayerAssistant:
                     if movement_direction:
                         moving_enemies.append((npc, movement_direction, distance))
     
+    # Forget npcs that left the radius or died, they start over without a baseline when back
+        tracked = {id(npc) for npc, _, _, _, _, _ in threats}
+        for npc_id in self.last_positions.keys() - tracked:
+            del self.last_positions[npc_id]
+    
     # Sort threats by distance
         threats.sort(key=lambda x: x[1])
     
@@ -353,7 +345,7 @@ class PlayerAssistant:
                 target_info += " (behind wall)"
             self.advice += f" {target_info}"
         
-        self.advice_time = pg.time.get_ticks()
+        self.advice_time = self.game.get_ticks()
     
     # Log data only if threats were processed
         if hasattr(self, 'logger') and threats:
@@ -434,7 +426,7 @@ class PlayerAssistant:
     
     def draw(self):
         """Draw the assistant's advice on screen and target indicators"""
-        current_time = pg.time.get_ticks()
+        current_time = self.game.get_ticks()
         
         # Always show status when inactive
         if not self.active and not self.advice:
@@ -480,7 +472,7 @@ class PlayerAssistant:
     def draw_directional_indicators(self):
         """Draw indicators around screen edges to show direction of threats"""
         player = self.game.player
-        npc_list = self.game.object_handler.npc_list
+        npc_index = self.game.object_handler.npc_index
         
         # Calculate screen center
         center_x, center_y = WIDTH // 2, HEIGHT // 2
@@ -504,12 +496,11 @@ class PlayerAssistant:
         pg.draw.line(self.game.screen, (0, 255, 0), radar_pos, (front_x, front_y), 2)
         
         # Draw enemies on radar
-        for npc in npc_list:
+        for npc, distance in npc_index.query_radius(player.x, player.y, 10):
             if npc.alive:
                 # Calculate relative position
                 dx = npc.x - player.x
                 dy = npc.y - player.y
-                distance = math.hypot(dx, dy)
                 
                 if distance < 10:  # Only show enemies within reasonable distance
                     # Check if hidden
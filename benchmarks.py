@@ -0,0 +1,372 @@
+import math
+import os
+import sys
+import tempfile
+import timeit
+import numpy as np
+import pygame as pg
+from collections import deque
+from random import Random
+from types import SimpleNamespace
+from settings import PVS_PATH
+from map import Map
+from pathfinding import PathFinding
+from hpa import HierarchicalPathFinding
+from visibility import Visibility
+from spatial import SpatialHash
+from columnar_log import ColumnarLog, convert_csv
+
+
+def bench_map_lookup(number=200_000):
+    game_map = Map(None)
+    rng = Random(0)
+    cells = [(rng.randrange(game_map.cols), rng.randrange(game_map.rows)) for _ in range(1024)]
+    world_map, grid, cols, rows = game_map.world_map, game_map.grid, game_map.cols, game_map.rows
+    is_wall = game_map.is_wall
+    grid_array = np.frombuffer(grid, dtype=np.uint8).reshape(rows, cols)
+    xs, ys = np.array(cells).T
+
+    def dict_lookup():
+        for x, y in cells:
+            (x, y) in world_map
+
+    def grid_method():
+        for x, y in cells:
+            is_wall(x, y)
+
+    def grid_index():
+        for x, y in cells:
+            0 <= x < cols and 0 <= y < rows and grid[y * cols + x]
+
+    def grid_numpy():
+        grid_array[ys, xs] != 0
+
+    repeat = max(1, number // len(cells))
+    print(f'map lookup ({game_map.cols}x{game_map.rows}, {repeat * len(cells)} lookups)')
+    for func in (dict_lookup, grid_method, grid_index, grid_numpy):
+        seconds = min(timeit.repeat(func, number=repeat, repeat=5))
+        print(f'  {func.__name__:<12} {seconds / (repeat * len(cells)) * 1e9:7.1f} ns/lookup')
+
+
+def bench_animation(counts=(10, 100, 1000, 10000), number=20):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    from sprite_object import AnimatedSprite
+
+    game = SimpleNamespace(player=None, get_ticks=pg.time.get_ticks)
+    path = 'resources/sprites/npc/soldier/walk/0.png'
+
+    def rotate_animate(sprite, images):
+        # per-instance deque rotation, as animations used to advance
+        images.rotate(-1)
+        sprite.image = images[0]
+
+    print(f'animation update ({number} updates per entity)')
+    for count in counts:
+        sprites = [AnimatedSprite(game, path=path) for _ in range(count)]
+        for sprite in sprites:
+            sprite.animation_trigger = True
+        rotating = [deque(sprite.images) for sprite in sprites]
+
+        def deque_rotate():
+            for sprite, images in zip(sprites, rotating):
+                rotate_animate(sprite, images)
+
+        def frame_index():
+            for sprite in sprites:
+                sprite.animate(sprite.images)
+
+        results = []
+        for func in (deque_rotate, frame_index):
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            results.append(f'{func.__name__} {seconds / (number * count) * 1e9:6.1f} ns')
+        deque_bytes = sum(sys.getsizeof(images) for images in rotating) // count
+        print(f'  {count:>6} entities: ' + ', '.join(results) +
+              f' per entity update, {deque_bytes} B per-instance deque')
+
+
+def bench_pathfinding(counts=(1, 10, 100), moves=20):
+    game = SimpleNamespace(object_handler=SimpleNamespace(npc_positions=set(), occupancy_version=0))
+    game.map = Map(game)
+    pathfinding = PathFinding(game)
+    rng = Random(0)
+    cells = list(pathfinding.graph)
+    goals = [rng.choice(cells) for _ in range(moves)]
+
+    print(f'path search ({moves} player moves)')
+    for count in counts:
+        starts = [rng.choice(cells) for _ in range(count)]
+
+        def bfs():
+            for goal in goals:
+                for start in starts:
+                    pathfinding.find_path(start, goal)
+
+        def flow_field():
+            pathfinding.flow_fields.clear()
+            for goal in goals:
+                for start in starts:
+                    pathfinding.get_flow_step(start, goal)
+
+        results = []
+        for func in (bfs, flow_field):
+            seconds = min(timeit.repeat(func, number=1, repeat=3))
+            results.append(f'{func.__name__} {seconds / moves * 1e3:7.3f} ms')
+        print(f'  {count:>4} agents: ' + ', '.join(results) + ' per player move')
+
+
+def generate_map(cols, rows, seed=0, wall_chance=0.2):
+    rng = Random(seed)
+    return [[1 if x in (0, cols - 1) or y in (0, rows - 1) or rng.random() < wall_chance else False
+             for x in range(cols)] for y in range(rows)]
+
+
+def bench_search(sizes=((16, 32), (48, 96), (160, 320)), queries=50):
+    print(f'single path search ({queries} random reachable queries)')
+    for cols, rows in sizes:
+        game = SimpleNamespace(object_handler=SimpleNamespace(npc_positions=set(), occupancy_version=0))
+        game.map = Map(game) if (cols, rows) == (16, 32) else Map(game, generate_map(cols, rows))
+        pathfinding = PathFinding(game)
+        rng = Random(0)
+        # keep to the largest connected area so every query has a path
+        cells, seen = [], set()
+        for node in pathfinding.graph:
+            if node not in seen:
+                area = pathfinding.reverse_bfs(node, pathfinding.graph)
+                seen.update(area)
+                cells = max(cells, list(area), key=len)
+        pairs = [(rng.choice(cells), rng.choice(cells)) for _ in range(queries)]
+
+        results = []
+        for search in (pathfinding.bfs, pathfinding.astar):
+            pathfinding.search = search
+            seconds = min(timeit.repeat(lambda: [pathfinding.find_path(*pair) for pair in pairs], number=1, repeat=3))
+            expanded = sum(len(search(*pair, pathfinding.graph)) for pair in pairs) // queries
+            results.append(f'{search.__name__} {seconds / queries * 1e3:7.3f} ms ({expanded} cells)')
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            build = timeit.timeit(lambda: HierarchicalPathFinding(pathfinding, cache_dir=cache_dir), number=1)
+            load = timeit.timeit(lambda: HierarchicalPathFinding(pathfinding, cache_dir=cache_dir), number=1)
+        hpa = HierarchicalPathFinding(pathfinding, cache_dir=cache_dir)
+        seconds = min(timeit.repeat(lambda: [hpa.get_next_step(*pair) for pair in pairs], number=1, repeat=3))
+        results.append(f'hpa {seconds / queries * 1e3:7.3f} ms')
+        print(f'  {cols}x{rows} ({len(cells)} reachable): ' + ', '.join(results) + ' per query')
+        print(f'    hpa abstraction: built in {build * 1e3:.1f} ms, loaded from disk in {load * 1e3:.1f} ms')
+
+
+def bench_map_edit(sizes=((16, 32), (160, 320)), edits=50):
+    print(f'map edits ({edits} random tiles toggled, flat graph and hpa abstraction kept current)')
+    for cols, rows in sizes:
+        game = SimpleNamespace(object_handler=SimpleNamespace(npc_positions=set(), occupancy_version=0))
+        game.map = Map(game) if (cols, rows) == (16, 32) else Map(game, generate_map(cols, rows))
+        rng = Random(0)
+        tiles = [(rng.randrange(1, cols - 1), rng.randrange(1, rows - 1)) for _ in range(edits)]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            game.pathfinding = PathFinding(game)
+            game.pathfinding.hpa = HierarchicalPathFinding(game.pathfinding, cache_dir=cache_dir)
+
+            def set_tile():
+                for x, y in tiles:
+                    game.map.set_tile(x, y, 0 if game.map.is_wall(x, y) else 1)
+
+            incremental = min(timeit.repeat(set_tile, number=1, repeat=3)) / edits
+            full = timeit.timeit(lambda: HierarchicalPathFinding(PathFinding(game), cache_dir=cache_dir + '/full'),
+                                 number=1)
+        print(f'  {cols}x{rows}: set_tile {incremental * 1e3:6.2f} ms per edit, full rebuild {full * 1e3:7.1f} ms')
+
+
+def bench_visibility(counts=(20, 200, 2000), steps=200):
+    game = SimpleNamespace()
+    game.map = Map(game)
+    rng = Random(0)
+    cells = [(x, y) for y in range(game.map.rows) for x in range(game.map.cols) if not game.map.is_wall(x, y)]
+    players = [SimpleNamespace(pos=(x + 0.5, y + 0.5)) for x, y in (rng.choice(cells) for _ in range(steps))]
+
+    print(f'player line of sight ({steps} player positions, {PVS_PATH} {"found" if os.path.exists(PVS_PATH) else "missing"})')
+    for count in counts:
+        entities = [SimpleNamespace(x=x + rng.random(), y=y + rng.random())
+                    for x, y in (rng.choice(cells) for _ in range(count))]
+        results = []
+        for name, use_pvs in (('exact', False), ('pvs', True)):
+            visibility = Visibility(game)
+            # marking the set as loaded without bits leaves only the exact test
+            visibility.pvs.loaded = not use_pvs
+
+            def cast():
+                for game.player in players:
+                    visibility.cast(entities)
+
+            seconds = min(timeit.repeat(cast, number=1, repeat=3))
+            results.append(f'{name} {seconds / steps * 1e3:6.3f} ms')
+        print(f'  {count:>5} npcs: ' + ', '.join(results) + ' per step')
+
+
+class Entity:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+def bench_proximity(counts=(20, 200, 2000), queries=200, size=(64, 64)):
+    rng = Random(0)
+    print(f'proximity queries ({queries} radius 7 and nearest queries, {size[0]}x{size[1]} area)')
+    for count in counts:
+        entities = [Entity(rng.uniform(0, size[0]), rng.uniform(0, size[1])) for _ in range(count)]
+        index = SpatialHash()
+        for entity in entities:
+            index.insert(entity)
+        points = [(rng.uniform(0, size[0]), rng.uniform(0, size[1])) for _ in range(queries)]
+
+        def scan():
+            for x, y in points:
+                [(e, d) for e in entities if (d := math.hypot(e.x - x, e.y - y)) <= 7]
+                min(entities, key=lambda e: math.hypot(e.x - x, e.y - y))
+
+        def spatial_hash():
+            for x, y in points:
+                index.query_radius(x, y, 7)
+                index.nearest(x, y)
+
+        def move():
+            for entity in entities:
+                entity.x = min(max(entity.x + rng.uniform(-0.05, 0.05), 0), size[0])
+                index.move(entity)
+
+        results = []
+        for func in (scan, spatial_hash):
+            seconds = min(timeit.repeat(func, number=1, repeat=3))
+            results.append(f'{func.__name__} {seconds / queries * 1e6:7.1f} us')
+        moving = min(timeit.repeat(move, number=1, repeat=3))
+        print(f'  {count:>5} entities: ' + ', '.join(results) +
+              f' per query pair, index upkeep {moving / count * 1e9:.0f} ns per moved entity')
+
+
+def populate(game, count, size, engine='objects'):
+    # a generated map with count npcs spread over it and an immortal player in the middle of them
+    from object_handler import ObjectHandler
+    from npc import SoldierNPC, CacoDemonNPC, CyberDemonNPC
+
+    rng = Random(0)
+    game.map = Map(game, generate_map(*size))
+    game.pathfinding = PathFinding(game)
+    cells = list(game.pathfinding.graph)
+    game.player.x, game.player.y = rng.choice(cells)
+    # no game over, which would reset the population
+    game.player.get_damage = lambda damage: None
+    game.visibility = Visibility(game)
+    game.object_handler = handler = ObjectHandler(game, engine)
+    while len(handler.npc_list) < count:
+        x, y = rng.choice(cells)
+        handler.add_npc(rng.choice((SoldierNPC, CacoDemonNPC, CyberDemonNPC))(game, pos=(x + 0.5, y + 0.5)))
+    return handler
+
+
+def time_steps(game, steps):
+    def update():
+        for _ in range(steps):
+            game.update()
+    return timeit.timeit(update, number=1) / steps
+
+
+def bench_npc_engine(counts=(20, 500, 2000), steps=100, size=(64, 64)):
+    from main import Game
+
+    print(f'npc population ({steps} simulation steps, every npc chasing the player, {size[0]}x{size[1]} map)')
+    game = Game(headless=True)
+    for count in counts:
+        results = []
+        for engine in 'objects', 'arrays':
+            handler = populate(game, count, size, engine)
+            for npc in handler.npc_list:
+                npc.player_search_trigger = True
+            results.append(f'{engine} {time_steps(game, steps) * 1e3:6.2f} ms')
+        print(f'  {count:>5} npcs: ' + ', '.join(results) + ' per step')
+    pg.quit()
+
+
+def bench_npc_lod(counts=(20, 500, 2000), steps=100, size=(128, 128)):
+    from main import Game
+
+    print(f'npc activity lod ({steps} simulation steps, idle npcs, {size[0]}x{size[1]} map)')
+    game = Game(headless=True)
+    for count in counts:
+        results = []
+        for lod in False, True:
+            handler = populate(game, count, size)
+            handler.scheduler.enabled = lod
+            seconds = time_steps(game, steps)
+            results.append(f'{"lod" if lod else "full"} {seconds * 1e3:6.2f} ms')
+        tiers = ', '.join(f'{n} {tier}' for tier, n in handler.scheduler.tier_counts.items())
+        print(f'  {count:>5} npcs: ' + ', '.join(results) + f' per step ({tiers})')
+    pg.quit()
+
+
+def bench_caches(frames=600):
+    from main import Game
+
+    print(f'caches ({frames} rendered frames of the scripted player)')
+    game = Game(headless=True)
+    from sprite_object import sprite_scale_cache
+
+    caches = {'wall columns': game.raycasting.wall_columns.columns, 'sprite scales': sprite_scale_cache.images,
+              'paths': game.pathfinding.path_cache}
+    for _ in range(frames):
+        game.update()
+        game.render()
+    for name, cache in caches.items():
+        stats = cache.stats()
+        print(f"  {name:<13} {stats['entries']:>5} entries {stats['memory_bytes'] / 2 ** 20:6.1f} MB, "
+              f"hit rate {stats['hit_rate']:.1%} ({stats['hits']} hits, {stats['misses']} misses)")
+    pg.quit()
+
+
+def bench_log_read(counts=(100_000, 1_000_000)):
+    import pandas as pd
+    from datetime import datetime, timedelta
+
+    print('assistant log read (every column, then dropna as training does)')
+    rng = np.random.default_rng(0)
+    for count in counts:
+        start = datetime(2025, 1, 1)
+        data = pd.DataFrame({
+            'timestamp': [(start + timedelta(milliseconds=500 * i)).isoformat() for i in range(count)],
+            'player_health': rng.integers(1, 101, count),
+            'threat_count': rng.integers(1, 5, count),
+            'closest_enemy_distance': rng.uniform(0, 7, count),
+            'in_fov': rng.random(count) < 0.5,
+            'is_hidden': rng.random(count) < 0.5,
+            'player_ammo': 0,
+            'nearby_health_packs': 0,
+            'player_position_x': rng.uniform(1, 15, count),
+            'player_position_y': rng.uniform(1, 31, count),
+            'advice': rng.choice(['Soldier to EAST at 5.1 units. Approach with caution.',
+                                  '2 enemies nearby. 2 enemies to the EAST!', 'CacoDemon to SOUTH (hidden)'], count),
+        })
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path, log_path = os.path.join(directory, 'logs.csv'), os.path.join(directory, 'logs.alog')
+            data.to_csv(csv_path, index=False)
+            convert = timeit.timeit(lambda: convert_csv(csv_path, log_path), number=1)
+            csv_read = min(timeit.repeat(lambda: pd.read_csv(csv_path).dropna(), number=1, repeat=3))
+            columnar_read = min(timeit.repeat(lambda: ColumnarLog(log_path).read_frame().dropna(), number=1, repeat=3))
+            sizes = os.path.getsize(csv_path) >> 20, os.path.getsize(log_path) >> 20
+        print(f'  {count:>9} rows: csv {csv_read * 1e3:7.1f} ms ({sizes[0]} MB), '
+              f'columnar {columnar_read * 1e3:7.1f} ms ({sizes[1]} MB), one-off conversion {convert:.1f} s')
+
+
+BENCHMARKS = {
+    'map': bench_map_lookup,
+    'animation': bench_animation,
+    'pathfinding': bench_pathfinding,
+    'search': bench_search,
+    'map_edit': bench_map_edit,
+    'visibility': bench_visibility,
+    'proximity': bench_proximity,
+    'npc_engine': bench_npc_engine,
+    'npc_lod': bench_npc_lod,
+    'caches': bench_caches,
+    'log_read': bench_log_read,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,199 @@
+import argparse
+import csv
+import json
+import os
+import struct
+import numpy as np
+
+ASSISTANT_SCHEMA = [
+    ('timestamp', '<M8[us]'),
+    ('player_health', '<i4'),
+    ('threat_count', '<i4'),
+    ('closest_enemy_distance', '<f8'),
+    ('in_fov', '|b1'),
+    ('is_hidden', '|b1'),
+    ('player_ammo', '<i4'),
+    ('nearby_health_packs', '<i4'),
+    ('player_position_x', '<f8'),
+    ('player_position_y', '<f8'),
+    ('advice', 'str'),
+]
+
+
+class ColumnarLog:
+    """
+    Append only log of typed columns. A header holds the schema as JSON, then each
+    append adds a segment: a row count, the item size of every column and the
+    dictionary size of string columns, followed by the columns as contiguous arrays,
+    8 byte aligned. String columns are dictionary encoded: int32 codes into the
+    segment's distinct values, UTF-8 at a fixed width.
+    Reading memory maps the file and views the columns in place, and a segment cut
+    short by a crash is ignored and overwritten by the next append.
+    """
+    magic = b'ALOG'
+    segment_magic = b'SEG1'
+    version = 1
+
+    def __init__(self, path, schema=ASSISTANT_SCHEMA):
+        self.path = path
+        self.schema = [(name, dtype) for name, dtype in schema]
+        self.fields = [name for name, _ in self.schema]
+        self.header = self.get_header()
+        # end of the last complete segment, found on the first append
+        self.end = None
+
+    def get_header(self):
+        schema = json.dumps({'version': self.version, 'fields': self.schema}).encode()
+        header = self.magic + struct.pack('<I', len(schema)) + schema
+        return header + bytes(-len(header) % 8)
+
+    def append(self, rows):
+        if not rows:
+            return
+        arrays, widths, counts = [], [], []
+        for name, dtype in self.schema:
+            values = [row[name] for row in rows]
+            if dtype == 'str':
+                dictionary, codes = np.unique(np.array([str(value).encode() for value in values], dtype=np.bytes_),
+                                              return_inverse=True)
+                arrays += [codes.astype('<i4'), dictionary]
+                widths.append(dictionary.dtype.itemsize)
+                counts.append(len(dictionary))
+            else:
+                arrays.append(np.array(values, dtype=dtype))
+                widths.append(arrays[-1].dtype.itemsize)
+                counts.append(0)
+
+        segment = [self.segment_magic, struct.pack(f'<{1 + 2 * len(widths)}I', len(rows), *widths, *counts)]
+        segment.append(bytes(-sum(map(len, segment)) % 8))
+        for array in arrays:
+            data = array.tobytes()
+            segment += [data, bytes(-len(data) % 8)]
+
+        if self.end is None:
+            self.end = self.scan()
+        with open(self.path, 'r+b' if self.end else 'wb') as file:
+            if not self.end:
+                file.write(self.header)
+                self.end = len(self.header)
+            file.seek(self.end)
+            file.truncate()
+            file.write(b''.join(segment))
+            self.end = file.tell()
+
+    def scan(self):
+        # offset after the last complete segment, 0 for a missing or empty file
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return 0
+        end = len(self.header)
+        for end, _ in self.iter_segments(offsets=True):
+            pass
+        return end
+
+    def iter_segments(self, columns=None, offsets=False):
+        # {name: array} per segment, or {name: (codes, dictionary)} for strings,
+        # the arrays are views of the memory mapped file
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return
+        data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        if bytes(data[:len(self.header)]) != self.header:
+            raise ValueError(f'{self.path} is not a log with this schema')
+        columns = self.fields if columns is None else columns
+        head_size = 8 + 8 * len(self.schema)
+        head_size += -head_size % 8
+        offset = len(self.header)
+        while offset + head_size <= len(data):
+            head = bytes(data[offset:offset + head_size])
+            if head[:4] != self.segment_magic:
+                break
+            rows, *sizes = struct.unpack_from(f'<{1 + 2 * len(self.schema)}I', head, 4)
+            widths, counts = sizes[:len(self.schema)], sizes[len(self.schema):]
+            arrays = []
+            for (name, dtype), width, count in zip(self.schema, widths, counts):
+                if dtype == 'str':
+                    arrays += [(name, '<i4', rows * 4), (name, f'S{width}', count * width)]
+                else:
+                    arrays.append((name, dtype, rows * width))
+            end = offset + head_size + sum(size + -size % 8 for _, _, size in arrays)
+            if end > len(data):
+                break
+
+            position = offset + head_size
+            segment = {}
+            for name, dtype, size in arrays:
+                if name in columns:
+                    array = data[position:position + size].view(dtype)
+                    segment[name] = (segment[name], array) if name in segment else array
+                position += size + -size % 8
+            offset = end
+            yield (offset, segment) if offsets else segment
+
+    def read(self, columns=None):
+        # whole columns concatenated over all segments, strings as an object array of str
+        columns = self.fields if columns is None else columns
+        segments = list(self.iter_segments(columns))
+        read = {}
+        for name, dtype in self.schema:
+            if name not in columns:
+                continue
+            if dtype != 'str':
+                read[name] = np.concatenate([segment[name] for segment in segments] or [np.zeros(0, dtype)])
+                continue
+            # only the distinct values of the whole log are decoded
+            dictionary = np.unique(np.concatenate([segment[name][1] for segment in segments] or [np.zeros(0, 'S1')]))
+            codes = [np.searchsorted(dictionary, segment[name][1])[segment[name][0]] for segment in segments]
+            values = np.array([value.decode() for value in dictionary], dtype=object)
+            read[name] = values[np.concatenate(codes or [np.zeros(0, np.int64)])]
+        return read
+
+    def read_frame(self, columns=None):
+        import pandas as pd
+
+        return pd.DataFrame(self.read(columns))
+
+
+def parse_value(text, dtype):
+    if not text:
+        raise ValueError('missing value')
+    if dtype == 'str':
+        return text
+    if dtype == '|b1':
+        if text not in ('True', 'False'):
+            raise ValueError(text)
+        return text == 'True'
+    if dtype == '<i4':
+        return int(float(text))
+    if dtype == '<f8':
+        return float(text)
+    return np.datetime64(text, 'us')
+
+
+def convert_csv(csv_path, log_path, chunk_rows=65536, schema=ASSISTANT_SCHEMA):
+    # rows with missing or malformed values are skipped, as dropna skips them in training
+    log = ColumnarLog(log_path, schema)
+    converted = skipped = 0
+    chunk = []
+    with open(csv_path, newline='') as file:
+        for row in csv.DictReader(file):
+            try:
+                chunk.append({name: parse_value(row[name], dtype) for name, dtype in log.schema})
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+                continue
+            if len(chunk) == chunk_rows:
+                log.append(chunk)
+                converted += len(chunk)
+                chunk = []
+    log.append(chunk)
+    return converted + len(chunk), skipped
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert an assistant CSV log to the columnar format')
+    parser.add_argument('csv_path', nargs='?', default='assistant_logs.csv')
+    parser.add_argument('log_path', nargs='?', default='assistant_logs.alog')
+    args = parser.parse_args()
+    if os.path.exists(args.log_path):
+        parser.error(f'{args.log_path} exists, rows would be appended twice')
+    converted, skipped = convert_csv(args.csv_path, args.log_path)
+    print(f'{converted} rows written to {args.log_path}, {skipped} incomplete rows skipped')
@@ -0,0 +1,64 @@
+import pygame as pg
+from collections import defaultdict
+from random import random, choice, randint
+from settings import *
+
+
+class KeyboardController:
+    def __init__(self, game):
+        self.game = game
+        self.pressed = defaultdict(bool)
+        self.rel = 0
+        self.fire = False
+
+    def handle_event(self, event):
+        if event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
+            self.fire = True
+
+    def update(self):
+        self.pressed = pg.key.get_pressed()
+        mx, my = pg.mouse.get_pos()
+        if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
+            pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
+        self.rel = pg.mouse.get_rel()[0]
+
+
+class ScriptedController:
+    """
+    Drives the player from code instead of the keyboard and mouse.
+    policy(game, controller) is called once per tick and sets pressed keys, rel and fire.
+    """
+    def __init__(self, game, policy=None):
+        self.game = game
+        self.policy = policy or RandomPolicy()
+        self.pressed = defaultdict(bool)
+        self.rel = 0
+        self.fire = False
+
+    def handle_event(self, event):
+        pass
+
+    def press(self, *keys):
+        self.pressed = defaultdict(bool, dict.fromkeys(keys, True))
+
+    def update(self):
+        self.policy(self.game, self)
+
+
+class RandomPolicy:
+    """Wanders the map: holds a random movement for a while, turns and fires at random."""
+    def __init__(self, hold_time=600, fire_chance=0.02):
+        self.hold_time = hold_time
+        self.fire_chance = fire_chance
+        self.keys = ((pg.K_w,), (pg.K_w, pg.K_a), (pg.K_w, pg.K_d), (pg.K_a,), (pg.K_d,), (pg.K_s,))
+        self.next_change = 0
+        self.turn = 0
+
+    def __call__(self, game, controller):
+        time_now = game.get_ticks()
+        if time_now >= self.next_change:
+            self.next_change = time_now + self.hold_time
+            controller.press(*choice(self.keys))
+            self.turn = randint(-MOUSE_MAX_REL // 2, MOUSE_MAX_REL // 2)
+        controller.rel = self.turn
+        controller.fire = random() < self.fire_chance
@@ -0,0 +1,249 @@
+import hashlib
+import math
+import os
+import pickle
+from heapq import heappush, heappop
+from settings import *
+
+
+class HierarchicalPathFinding:
+    """
+    HPA* over square clusters of the map. Entrances are placed on the borders between
+    neighbouring clusters and the costs between the entrances of each cluster are
+    precomputed, so a query searches this small abstract graph and only walks tiles
+    inside the start and goal clusters. The abstraction is cached on disk by map hash.
+    """
+    version = 1
+
+    def __init__(self, pathfinding, cluster_size=HPA_CLUSTER_SIZE, cache_dir=HPA_CACHE_DIR):
+        self.game = pathfinding.game
+        self.graph = pathfinding.graph
+        self.cluster_size = cluster_size
+        self.cache_dir = cache_dir
+        self.cols, self.rows = self.game.map.cols, self.game.map.rows
+        self.cluster_cols = -(-self.cols // cluster_size)
+        self.cluster_rows = -(-self.rows // cluster_size)
+        self.diagonal = math.sqrt(2)
+        # (cluster, right or lower neighbour) -> [(tile, tile across the border), ...]
+        self.borders = {}
+        # cluster -> {entrance: {entrance: cost}}
+        self.edges = {}
+        # entrance -> {entrance across the border: 1}
+        self.links = {}
+        # entrance -> [(entrance, cost), ...] over both kinds of edges
+        self.abstract_graph = {}
+        if not self.load():
+            self.build()
+            self.save()
+
+    def get_cluster(self, node):
+        return node[0] // self.cluster_size, node[1] // self.cluster_size
+
+    def get_key(self):
+        game_map = self.game.map
+        key = hashlib.sha1(f'{self.version} {game_map.cols} {game_map.rows} {self.cluster_size} '.encode())
+        key.update(bytes(game_map.grid))
+        return key.hexdigest()
+
+    def get_cache_path(self):
+        return os.path.join(self.cache_dir, f'{self.get_key()}.pickle')
+
+    def load(self):
+        try:
+            with open(self.get_cache_path(), 'rb') as file:
+                self.borders, self.edges = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return False
+        self.get_links()
+        self.get_abstract_graph()
+        return True
+
+    def save(self):
+        path = self.get_cache_path()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(path + '.tmp', 'wb') as file:
+                pickle.dump((self.borders, self.edges), file, pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f'Could not save path abstraction: {e}')
+
+    def build(self):
+        for cy in range(self.cluster_rows):
+            for cx in range(self.cluster_cols):
+                if cx + 1 < self.cluster_cols:
+                    self.build_border((cx, cy), (cx + 1, cy))
+                if cy + 1 < self.cluster_rows:
+                    self.build_border((cx, cy), (cx, cy + 1))
+        self.get_links()
+        for cy in range(self.cluster_rows):
+            for cx in range(self.cluster_cols):
+                self.build_cluster((cx, cy))
+        self.get_abstract_graph()
+
+    def build_border(self, cluster, neighbour):
+        size = self.cluster_size
+        if neighbour[0] > cluster[0]:
+            x = neighbour[0] * size
+            pairs = [((x - 1, y), (x, y)) for y in range(cluster[1] * size, min((cluster[1] + 1) * size, self.rows))]
+        else:
+            y = neighbour[1] * size
+            pairs = [((x, y - 1), (x, y)) for x in range(cluster[0] * size, min((cluster[0] + 1) * size, self.cols))]
+
+        # one entrance in the middle of each open run, two at the ends of long runs
+        entrances, run = [], []
+        for pair in pairs + [None]:
+            if pair and pair[0] in self.graph and pair[1] in self.graph:
+                run.append(pair)
+                continue
+            if len(run) >= 6:
+                entrances += [run[0], run[-1]]
+            elif run:
+                entrances.append(run[len(run) // 2])
+            run = []
+        self.borders[cluster, neighbour] = entrances
+
+    def get_links(self):
+        self.links = {}
+        for entrances in self.borders.values():
+            self.add_links(entrances)
+
+    def add_links(self, entrances):
+        for a, b in entrances:
+            self.links.setdefault(a, {})[b] = 1
+            self.links.setdefault(b, {})[a] = 1
+
+    def remove_links(self, entrances):
+        for a, b in entrances:
+            for node, other in (a, b), (b, a):
+                del self.links[node][other]
+                if not self.links[node]:
+                    del self.links[node]
+
+    def get_abstract_graph(self, clusters=None):
+        for cluster in self.edges if clusters is None else clusters:
+            for node, next_nodes in self.edges[cluster].items():
+                self.abstract_graph[node] = list(next_nodes.items()) + list(self.links.get(node, {}).items())
+
+    def update_tile(self, x, y):
+        # the tile changed graph edges in the clusters of its 3x3 block: rebuild their borders and
+        # entrance costs, and the costs of neighbour clusters whose entrances moved
+        clusters = {self.get_cluster((i, j)) for j in range(max(y - 1, 0), min(y + 2, self.rows))
+                    for i in range(max(x - 1, 0), min(x + 2, self.cols))}
+        borders = {border for cx, cy in clusters
+                   for border in (((cx, cy), (cx + 1, cy)), ((cx, cy), (cx, cy + 1)),
+                                  ((cx - 1, cy), (cx, cy)), ((cx, cy - 1), (cx, cy)))
+                   if border in self.borders}
+        touched = {cluster for border in borders for cluster in border} | clusters
+        old_entrances = {cluster: self.get_entrances(cluster) for cluster in touched}
+
+        for border in borders:
+            self.remove_links(self.borders[border])
+            self.build_border(*border)
+            self.add_links(self.borders[border])
+        for cluster in touched:
+            for node in self.edges.get(cluster, ()):
+                self.abstract_graph.pop(node, None)
+            if cluster in clusters or self.get_entrances(cluster) != old_entrances[cluster]:
+                self.build_cluster(cluster)
+        self.get_abstract_graph(touched)
+
+    def get_entrances(self, cluster):
+        cx, cy = cluster
+        entrances = set()
+        for neighbour in (cx + 1, cy), (cx, cy + 1):
+            entrances.update(a for a, b in self.borders.get((cluster, neighbour), ()))
+        for neighbour in (cx - 1, cy), (cx, cy - 1):
+            entrances.update(b for a, b in self.borders.get((neighbour, cluster), ()))
+        return entrances
+
+    def build_cluster(self, cluster):
+        entrances = self.get_entrances(cluster)
+        edges = self.edges[cluster] = {}
+        for entrance in entrances:
+            costs, _ = self.search_cluster(entrance, cluster)
+            edges[entrance] = {other: costs[other] for other in entrances if other != entrance and other in costs}
+
+    def search_cluster(self, start, cluster, occupied=()):
+        # dijkstra over the tiles of one cluster
+        x0, y0 = cluster[0] * self.cluster_size, cluster[1] * self.cluster_size
+        x1, y1 = x0 + self.cluster_size, y0 + self.cluster_size
+        queue = [(0, start)]
+        costs = {start: 0}
+        came_from = {start: None}
+
+        while queue:
+            cur_cost, cur_node = heappop(queue)
+            if cur_cost > costs[cur_node]:
+                continue
+            x, y = cur_node
+
+            for next_node in self.graph.get(cur_node, ()):
+                next_x, next_y = next_node
+                if not (x0 <= next_x < x1 and y0 <= next_y < y1) or next_node in occupied:
+                    continue
+                next_cost = cur_cost + (self.diagonal if next_x != x and next_y != y else 1)
+                if next_cost < costs.get(next_node, math.inf):
+                    costs[next_node] = next_cost
+                    came_from[next_node] = cur_node
+                    heappush(queue, (next_cost, next_node))
+        return costs, came_from
+
+    def get_next_step(self, start, goal):
+        if start == goal:
+            return goal
+        start_cluster, goal_cluster = self.get_cluster(start), self.get_cluster(goal)
+        start_costs, start_came_from = self.search_cluster(
+            start, start_cluster, self.game.object_handler.npc_positions)
+        if start_cluster == goal_cluster and goal in start_costs:
+            return self.get_first_step(start_came_from, start, goal)
+
+        goal_costs, _ = self.search_cluster(goal, goal_cluster)
+        came_from = self.search_abstract(start, goal, start_costs, goal_costs)
+        if goal not in came_from:
+            return goal
+
+        node = self.get_first_step(came_from, start, goal)
+        if node in start_came_from:
+            return self.get_first_step(start_came_from, start, node)
+        # start is an entrance and the path leaves through its border link
+        return node
+
+    def search_abstract(self, start, goal, start_costs, goal_costs):
+        start_cluster, goal_cluster = self.get_cluster(start), self.get_cluster(goal)
+        start_edges = {node: start_costs[node] for node in self.get_entrances(start_cluster) if node in start_costs}
+        start_edges.update(self.links.get(start, {}))
+        goal_edges = {node: goal_costs[node] for node in self.get_entrances(goal_cluster) if node in goal_costs}
+        goal_x, goal_y = goal
+        queue = [(0, 0, start)]
+        costs = {start: 0}
+        came_from = {start: None}
+
+        while queue:
+            _, cur_cost, cur_node = heappop(queue)
+            if cur_node == goal:
+                break
+            if cur_cost > costs[cur_node]:
+                continue
+
+            if cur_node == start:
+                next_nodes = start_edges.items()
+            else:
+                next_nodes = self.abstract_graph.get(cur_node, [])
+            if cur_node in goal_edges:
+                next_nodes = list(next_nodes) + [(goal, goal_edges[cur_node])]
+
+            for next_node, step_cost in next_nodes:
+                next_cost = cur_cost + step_cost
+                if next_cost < costs.get(next_node, math.inf):
+                    costs[next_node] = next_cost
+                    came_from[next_node] = cur_node
+                    dx, dy = abs(next_node[0] - goal_x), abs(next_node[1] - goal_y)
+                    heappush(queue, (next_cost + dx + dy + (self.diagonal - 2) * min(dx, dy), next_cost, next_node))
+        return came_from
+
+    @staticmethod
+    def get_first_step(came_from, start, node):
+        while came_from[node] != start:
+            node = came_from[node]
+        return node
@@ -0,0 +1,94 @@
+from settings import *
+
+
+class ActivityScheduler:
+    """
+    Level of detail for npc updates. Alerted, hurt, dying and nearby npcs are active and
+    update every simulation step. Far idle npcs are dormant and update once every
+    LOD_DORMANT_INTERVAL steps, round robin, until the player comes near or fires.
+    Dead npcs whose death animation has finished are not updated at all.
+    """
+    tiers = 'active', 'dormant', 'dead'
+
+    def __init__(self, game, enabled=NPC_LOD, interval=LOD_DORMANT_INTERVAL):
+        self.game = game
+        self.enabled = enabled
+        self.interval = interval
+        self.step = 0
+        # npcs this step updates
+        self.awake = []
+        # npc -> tier, the npcs of each tier, dormant ones split into one bucket per step of the interval
+        self.tier = {}
+        self.active = {}
+        self.dormant = [{} for _ in range(interval)]
+        self.dead = {}
+        self.phase = {}
+        self.seen = 0
+        # npc -> sim time until which a shot keeps it awake
+        self.woken = {}
+
+    @property
+    def tier_counts(self):
+        if not self.enabled or self.game.object_handler.npc_engine:
+            return {'active': len(self.game.object_handler.npc_list), 'dormant': 0, 'dead': 0}
+        return {'active': len(self.active), 'dormant': sum(map(len, self.dormant)), 'dead': len(self.dead)}
+
+    def update(self):
+        handler = self.game.object_handler
+        if not self.enabled or handler.npc_engine:
+            # the array engine batches every npc anyway
+            self.awake = handler.npc_list
+            return
+
+        # a dormant npc only changes tier when it is updated, approached or hears a shot,
+        # so only those are checked
+        player = self.game.player
+        time_now = self.game.get_ticks()
+        changed = list(self.awake)
+        for npc in handler.npc_list[self.seen:]:
+            self.phase[npc] = self.seen % self.interval
+            self.seen += 1
+            changed.append(npc)
+        if player.shot:
+            for npc, _ in handler.npc_index.query_radius(player.x, player.y, LOD_HEARING_DIST):
+                self.woken[npc] = time_now + LOD_WAKE_TIME
+                changed.append(npc)
+        near = {npc for npc, _ in handler.npc_index.query_radius(player.x, player.y, LOD_ACTIVE_DIST)}
+        changed += near
+        changed += [npc for npc, until in self.woken.items() if until <= time_now]
+        for npc in set(changed):
+            self.set_tier(npc, self.get_tier(npc, near, time_now))
+
+        self.step += 1
+        self.awake = list(self.active)
+        if player.shot:
+            # every live npc takes the step of a shot, the hit test needs its projection
+            for bucket in self.dormant:
+                self.awake += bucket
+        else:
+            self.awake += self.dormant[self.step % self.interval]
+
+    def get_tier(self, npc, near, time_now):
+        if not npc.alive:
+            self.woken.pop(npc, None)
+            return 'active' if npc.frame_counter < len(npc.death_images) - 1 else 'dead'
+        if npc.player_search_trigger or npc.pain or npc in near:
+            return 'active'
+        if self.woken.get(npc, 0) > time_now:
+            return 'active'
+        self.woken.pop(npc, None)
+        return 'dormant'
+
+    def set_tier(self, npc, tier):
+        old = self.tier.get(npc)
+        if old == tier:
+            return
+        if old:
+            del self.get_members(npc, old)[npc]
+        self.get_members(npc, tier)[npc] = None
+        self.tier[npc] = tier
+
+    def get_members(self, npc, tier):
+        if tier == 'dormant':
+            return self.dormant[self.phase[npc]]
+        return self.active if tier == 'active' else self.dead
@@ -0,0 +1,296 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+import uuid
+import warnings
+from datetime import datetime
+from settings import LOG_SHARD_DIR, LOG_SHARD_ROWS, LOG_SHARD_SECONDS, LOG_FORMAT
+from columnar_log import ColumnarLog, ASSISTANT_SCHEMA
+
+FIELDS = [name for name, _ in ASSISTANT_SCHEMA]
+EXTENSIONS = {'csv': '.csv', 'columnar': '.alog'}
+
+
+class CsvLog:
+    def __init__(self, path, fields=FIELDS):
+        self.path = path
+        self.fields = fields
+
+    def append(self, rows):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, mode='a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=self.fields)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    def read_frame(self, columns=None):
+        import pandas as pd
+
+        data = pd.read_csv(self.path, usecols=columns)
+        if 'timestamp' in data:
+            data['timestamp'] = parse_timestamps(data['timestamp'], self.path)
+        return data
+
+
+def parse_timestamps(values, path):
+    # isoformat() leaves out zero microseconds, so the format is not guessed from the first value
+    import pandas as pd
+
+    timestamps = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    failed = int(timestamps.isna().sum() - values.isna().sum())
+    if failed:
+        warnings.warn(f'{failed} timestamps of {path} could not be parsed')
+    return timestamps
+
+
+def open_log(path, fields=FIELDS):
+    return ColumnarLog(path) if path.endswith(EXTENSIONS['columnar']) else CsvLog(path, fields)
+
+
+class ShardedLog:
+    """
+    Log split into shards of at most max_rows rows or max_age seconds of play, in
+    one directory. Next to every shard a sidecar <shard>.json holds its row count,
+    first and last timestamp and whether a logger still appends to it. Only the
+    logger writing a shard writes its sidecar, so games logging in parallel never
+    share a file, and the manifest is the collection of all sidecars. Reads select
+    the shards of a time window from it, and compact() merges small closed shards
+    and drops duplicate rows.
+    """
+    sidecar_suffix = '.json'
+    stale_age = 60 * 60  # seconds after which a shard left open by a crashed game counts as closed
+
+    def __init__(self, directory=LOG_SHARD_DIR, log_format=LOG_FORMAT, max_rows=LOG_SHARD_ROWS,
+                 max_age=LOG_SHARD_SECONDS, fields=FIELDS):
+        self.directory = directory
+        self.log_format = log_format
+        self.fields = fields
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.legacy_manifest = os.path.join(directory, 'manifest.json')
+        self.compact_lock = os.path.join(directory, 'compact.lock')
+        self.imports = os.path.join(directory, 'imports.json')
+        # sidecar entry and log of the shard this instance is writing
+        self.shard = None
+        self.log = None
+
+    def get_sidecar(self, name):
+        return os.path.join(self.directory, name + self.sidecar_suffix)
+
+    def load_manifest(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return {'version': 2, 'shards': []}
+        if 'manifest.json' in names:
+            self.migrate()
+            names = os.listdir(self.directory)
+        shards = []
+        for name in names:
+            if not name.endswith(tuple(extension + self.sidecar_suffix for extension in EXTENSIONS.values())):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as file:
+                    shards.append(json.load(file))
+            except FileNotFoundError:
+                # removed by a compaction meanwhile
+                continue
+        # shards merged by a compaction that has not removed them yet
+        replaced = {name for shard in shards for name in shard.get('replaces', ())}
+        shards = [shard for shard in shards if shard['file'] not in replaced]
+        return {'version': 2, 'shards': sorted(shards, key=lambda shard: shard['start'])}
+
+    def migrate(self):
+        # the single manifest.json of earlier versions becomes one sidecar per shard
+        try:
+            with open(self.legacy_manifest) as file:
+                shards = json.load(file)['shards']
+        except FileNotFoundError:
+            return
+        for shard in shards:
+            if not os.path.exists(self.get_sidecar(shard['file'])):
+                self.save_shard(dict(shard, open=False))
+        os.remove(self.legacy_manifest)
+
+    def save_shard(self, shard):
+        sidecar = self.get_sidecar(shard['file'])
+        temp = f'{sidecar}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp, 'w') as file:
+            json.dump(shard, file)
+        os.replace(temp, sidecar)
+
+    def new_shard(self, start):
+        stamp = datetime.fromisoformat(str(start)).strftime('%Y%m%dT%H%M%S')
+        name = f'assistant-{stamp}-{uuid.uuid4().hex[:8]}{EXTENSIONS[self.log_format]}'
+        return {'file': name, 'rows': 0, 'start': str(start), 'end': str(start), 'open': True}
+
+    def is_full(self, shard, timestamp):
+        age = datetime.fromisoformat(str(timestamp)) - datetime.fromisoformat(shard['start'])
+        return shard['rows'] >= self.max_rows or age.total_seconds() >= self.max_age
+
+    def is_open(self, shard):
+        if not shard.get('open'):
+            return False
+        try:
+            return time.time() - os.path.getmtime(self.get_sidecar(shard['file'])) < self.stale_age
+        except FileNotFoundError:
+            return False
+
+    def append(self, rows):
+        os.makedirs(self.directory, exist_ok=True)
+        while rows:
+            if self.shard is None or self.is_full(self.shard, rows[0]['timestamp']):
+                self.close()
+                self.shard = self.new_shard(rows[0]['timestamp'])
+                self.log = open_log(os.path.join(self.directory, self.shard['file']), self.fields)
+            count = self.max_rows - self.shard['rows']
+            batch, rows = rows[:count], rows[count:]
+            self.log.append(batch)
+            self.shard['rows'] += len(batch)
+            self.shard['end'] = str(batch[-1]['timestamp'])
+            self.save_shard(self.shard)
+
+    def close(self):
+        # marks the shard being written as closed, compact() may merge it from then on
+        if self.shard is not None:
+            self.shard['open'] = False
+            self.save_shard(self.shard)
+            self.shard = self.log = None
+
+    def update_manifest(self, shards, removed=None):
+        # sidecars for new shards, which hide the removed ones from readers before they are deleted;
+        # removed maps each file to its rows, so the trainer knows whether it had read them all
+        removed = removed or {}
+        for shard in shards:
+            self.save_shard(dict(shard, open=False, replaces=dict(sorted(removed.items()))))
+        for name in removed:
+            os.remove(self.get_sidecar(name))
+            os.remove(os.path.join(self.directory, name))
+
+    def select(self, start=None, end=None):
+        # manifest entries of the shards with rows in [start, end)
+        start = start and datetime.fromisoformat(str(start))
+        end = end and datetime.fromisoformat(str(end))
+        return [shard for shard in self.load_manifest()['shards']
+                if (start is None or datetime.fromisoformat(shard['end']) >= start) and
+                (end is None or datetime.fromisoformat(shard['start']) < end)]
+
+    def read_frame(self, start=None, end=None, columns=None):
+        import pandas as pd
+
+        columns = columns and list(dict.fromkeys(['timestamp', *columns]))
+        frames = [open_log(os.path.join(self.directory, shard['file'])).read_frame(columns)
+                  for shard in self.select(start, end)]
+        if not frames:
+            return pd.DataFrame(columns=columns or self.fields)
+        data = pd.concat(frames, ignore_index=True)
+        if start is not None:
+            data = data[data['timestamp'] >= pd.Timestamp(start)]
+        if end is not None:
+            data = data[data['timestamp'] < pd.Timestamp(end)]
+        return data
+
+    def compact(self):
+        # merges every closed shard smaller than max_rows into time ordered shards without duplicates,
+        # shards games are still writing are left alone
+        try:
+            os.close(os.open(self.compact_lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            raise RuntimeError(f'another compaction is running, or remove {self.compact_lock} after a crash')
+        try:
+            small = [shard for shard in self.load_manifest()['shards']
+                     if shard['rows'] < self.max_rows and not self.is_open(shard)]
+            if len(small) < 2:
+                return 0, 0
+            import pandas as pd
+
+            data = pd.concat([open_log(os.path.join(self.directory, shard['file'])).read_frame()
+                              for shard in small], ignore_index=True)
+            rows = len(data)
+            data = data.dropna().drop_duplicates().sort_values('timestamp', kind='stable')
+            self.update_manifest(self.write_frame(data), removed={shard['file']: shard['rows'] for shard in small})
+            return rows, rows - len(data)
+        finally:
+            os.remove(self.compact_lock)
+
+    def write_frame(self, data):
+        # the rows of a time ordered frame as new shards, bounded like appended ones,
+        # without touching the manifest
+        os.makedirs(self.directory, exist_ok=True)
+        timestamps = list(data['timestamp'])
+        bounds = [0]
+        for i in range(1, len(timestamps)):
+            if (i - bounds[-1] >= self.max_rows or
+                    (timestamps[i] - timestamps[bounds[-1]]).total_seconds() >= self.max_age):
+                bounds.append(i)
+        bounds.append(len(data))
+
+        data = data.assign(timestamp=data['timestamp'].map(lambda timestamp: timestamp.isoformat()))
+        shards = []
+        for first, last in zip(bounds, bounds[1:]):
+            rows = data.iloc[first:last].to_dict('records')
+            if not rows:
+                continue
+            shard = self.new_shard(rows[0]['timestamp'])
+            open_log(os.path.join(self.directory, shard['file']), self.fields).append(rows)
+            shard.update(rows=len(rows), end=rows[-1]['timestamp'])
+            shards.append(shard)
+        return shards
+
+    def import_log(self, path):
+        data = open_log(path).read_frame().dropna()
+        shards = self.write_frame(data.sort_values('timestamp', kind='stable'))
+        self.update_manifest(shards)
+        return len(data)
+
+    def import_once(self, path):
+        # imports a log file kept from before the rotation the first time it is seen, the
+        # size it had then is recorded so it is neither imported twice nor dropped silently
+        try:
+            with open(self.imports) as file:
+                imports = json.load(file)
+        except FileNotFoundError:
+            imports = {}
+        key = os.path.abspath(path)
+        size = os.path.getsize(path)
+        if key in imports:
+            if imports[key] != size:
+                warnings.warn(f'{path} changed since it was imported into {self.directory}, '
+                              f'its new rows are not read')
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        rows = self.import_log(path)
+        imports[key] = size
+        temp = f'{self.imports}.{os.getpid()}.tmp'
+        with open(temp, 'w') as file:
+            json.dump(imports, file)
+        os.replace(temp, self.imports)
+        return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the sharded assistant logs')
+    parser.add_argument('--dir', default=LOG_SHARD_DIR, help='shard directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='print the manifest')
+    commands.add_parser('compact', help='merge small closed shards and drop duplicate rows')
+    import_parser = commands.add_parser('import', help='add a CSV or columnar log file as shards')
+    import_parser.add_argument('path')
+    args = parser.parse_args()
+
+    log = ShardedLog(args.dir)
+    if args.command == 'list':
+        shards = log.load_manifest()['shards']
+        for shard in shards:
+            state = ' (open)' if log.is_open(shard) else ''
+            print(f"{shard['file']}: {shard['rows']} rows, {shard['start']} to {shard['end']}{state}")
+        print(f"{len(shards)} shards, {sum(shard['rows'] for shard in shards)} rows")
+    elif args.command == 'compact':
+        rows, duplicates = log.compact()
+        print(f'{rows} rows compacted, {duplicates} duplicate or incomplete rows dropped')
+    else:
+        print(f'{log.import_log(args.path)} rows imported from {args.path}')
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Least recently used cache, bounded by its number of entries and, when given a
+    get_size function, by the total size of its values in bytes. Hits, misses and
+    memory are kept for the benchmarks (stats()).
+    """
+    def __init__(self, max_size=None, max_bytes=None, get_size=None):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.get_size = get_size
+        self.entries = OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        size = self.get_size(value) if self.get_size else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # would evict everything else and still not fit
+            return value
+        old = self.entries.pop(key, None)
+        if old is not None and self.get_size:
+            self.memory -= self.get_size(old)
+        self.entries[key] = value
+        self.memory += size
+        while ((self.max_size is not None and len(self.entries) > self.max_size) or
+               (self.max_bytes is not None and self.memory > self.max_bytes)):
+            _, old = self.entries.popitem(last=False)
+            if self.get_size:
+                self.memory -= self.get_size(old)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.memory = 0
+
+    def stats(self):
+        return {'entries': len(self.entries), 'memory_bytes': self.memory, 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': self.hit_rate}
@@ -1,4 +1,6 @@
 import pygame as pg
+import argparse
+import os
 import sys
 from settings import *
 from map import *
@@ -10,30 +12,49 @@ from object_handler import *
 from weapon import *
 from sound import *
 from pathfinding import *
+from visibility import Visibility
+from spatial import SpatialHash
 from assistant import PlayerAssistant  # Changed back to match your project structure
 from ml_agent import BaseAgent  # Import ML agents
+from controller import KeyboardController, ScriptedController
 
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, controller=None, assistant=False):
+        # headless: no window, audio or vsync, scripted input and a simulated clock
+        self.headless = headless
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
         pg.init()
-        pg.mouse.set_visible(False)
         self.screen = pg.display.set_mode(RES)
-        pg.event.set_grab(True)
+        if not headless:
+            pg.mouse.set_visible(False)
+            pg.event.set_grab(True)
         self.clock = pg.time.Clock()
-        self.delta_time = 1
+        # the simulation always advances in fixed steps of simulated time,
+        # rendering interpolates between the last two steps by alpha
+        self.delta_time = SIM_DELTA_TIME
+        self.time = 0
+        self.accumulator = 0
+        self.alpha = 1
         self.global_trigger = False
-        self.global_event = pg.USEREVENT + 0
-        pg.time.set_timer(self.global_event, 40)
+        self.global_event_time = 40
+        self.controller = controller or (ScriptedController(self) if headless else KeyboardController(self))
+        self.assistant_enabled = assistant
         self.new_game()
 
     def new_game(self):
+        if hasattr(self, 'assistant'):
+            # the old logger's thread writes its last rows in the background
+            self.assistant.logger.close(wait=False)
         self.map = Map(self)
         self.player = Player(self)
         self.object_renderer = ObjectRenderer(self)
         self.raycasting = RayCasting(self)
         self.object_handler = ObjectHandler(self)
+        self.visibility = Visibility(self)
         self.weapon = Weapon(self)
-        self.sound = Sound(self)
+        self.sound = NullSound(self) if self.headless else Sound(self)
         self.pathfinding = PathFinding(self)
         self.assistant = PlayerAssistant(self)
         self.ml_agents = [
@@ -41,19 +62,51 @@ class Game:
             BaseAgent(self, 6, 6, 'hider'),
             BaseAgent(self, 4, 3, 'hider'),
         ]
-        pg.mixer.music.play(-1)
+        self.agent_index = SpatialHash()
+        for agent in self.ml_agents:
+            self.agent_index.insert(agent)
+        if self.assistant_enabled:
+            self.assistant.toggle()
+        self.sound.play_theme()
+
+    def get_ticks(self):
+        return self.time
 
     def update(self):
+        # one fixed simulation step
+        time_next = self.time + self.delta_time
+        self.global_trigger = time_next // self.global_event_time != self.time // self.global_event_time
+        self.controller.update()
         self.player.update()
-        self.raycasting.update()
+        self.object_handler.scheduler.update()
+        self.visibility.update()
         self.object_handler.update()
         self.weapon.update()
         self.assistant.update()
         for agent in self.ml_agents:
             agent.update()
+            self.agent_index.move(agent)
+        self.time = time_next
+
+    def simulate(self, frame_time):
+        self.accumulator += frame_time
+        steps = 0
+        while self.accumulator >= self.delta_time and steps < MAX_SIM_STEPS:
+            self.update()
+            self.accumulator -= self.delta_time
+            steps += 1
+        if steps == MAX_SIM_STEPS:
+            # too far behind to catch up, slow the simulation down instead of spiralling
+            self.accumulator %= self.delta_time
+        self.alpha = self.accumulator / self.delta_time
+
+    def render(self):
+        self.raycasting.update()
+        self.object_handler.render()
+        self.draw()
         pg.display.flip()
-        self.delta_time = self.clock.tick(FPS)
-        pg.display.set_caption(f'{self.clock.get_fps() :.1f}')
+        tiers = ' '.join(f'{count} {tier}' for tier, count in self.object_handler.scheduler.tier_counts.items())
+        pg.display.set_caption(f'{self.clock.get_fps() :.1f}  npcs: {tiers}')
 
     def draw(self):
         self.object_renderer.draw()
@@ -63,24 +116,36 @@ class Game:
             agent.draw()
 
     def check_events(self):
-        self.global_trigger = False
         for event in pg.event.get():
             if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
-                pg.quit()
-                sys.exit()
-            elif event.type == self.global_event:
-                self.global_trigger = True
+                self.quit()
             elif event.type == pg.KEYDOWN:
                 if event.key == pg.K_m:
                     self.assistant.toggle()
-            self.player.single_fire_event(event)
+            self.controller.handle_event(event)
 
-    def run(self):
-        while True:
+    def quit(self):
+        self.assistant.logger.close()
+        pg.quit()
+        sys.exit()
+
+    def run(self, max_frames=None):
+        frame = 0
+        while max_frames is None or frame < max_frames:
             self.check_events()
-            self.update()
-            self.draw()
+            if self.headless:
+                # no rendering and no frame limit, just back to back simulation steps
+                self.update()
+            else:
+                self.simulate(self.clock.tick(FPS))
+                self.render()
+            frame += 1
 
 if __name__ == '__main__':
-    game = Game()
-    game.run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--headless', action='store_true', help='run without a window, audio or frame limit')
+    parser.add_argument('--frames', type=int, help='stop after this many frames')
+    parser.add_argument('--assistant', action='store_true', help='start with the assistant active')
+    args = parser.parse_args()
+    game = Game(headless=args.headless, assistant=args.assistant)
+    game.run(args.frames)
@@ -38,12 +38,16 @@ mini_map = [
 
 
 class Map:
-    def __init__(self, game):
+    def __init__(self, game, mini_map=mini_map):
         self.game = game
-        self.mini_map = mini_map
+        # a copy of the layout, so tiles can change without touching the module level map
+        self.mini_map = [list(row) for row in mini_map]
         self.world_map = {}
         self.rows = len(self.mini_map)
         self.cols = len(self.mini_map[0])
+        # texture id per tile (0 = empty), row-major: tile (x, y) is grid[y * cols + x]
+        self.grid = bytearray(self.rows * self.cols)
+        self.version = 0
         self.get_map()
 
     def get_map(self):
@@ -51,6 +55,29 @@ class Map:
             for i, value in enumerate(row):
                 if value:
                     self.world_map[(i, j)] = value
+                    self.grid[j * self.cols + i] = value
+
+    def set_tile(self, x, y, value):
+        # open or close a single tile (doors, destructible walls), value is a texture id or 0
+        value = value or 0
+        if not (0 <= x < self.cols and 0 <= y < self.rows) or self.mini_map[y][x] == value:
+            return
+        self.mini_map[y][x] = value
+        self.grid[y * self.cols + x] = value
+        if value:
+            self.world_map[(x, y)] = value
+        else:
+            self.world_map.pop((x, y), None)
+        self.version += 1
+        self.game.pathfinding.update_tile(x, y)
+
+    def get_tile(self, x, y):
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self.grid[y * self.cols + x]
+        return 0
+
+    def is_wall(self, x, y):
+        return 0 <= x < self.cols and 0 <= y < self.rows and self.grid[y * self.cols + x] != 0
 
     def draw(self):
         [pg.draw.rect(self.game.screen, 'darkgray', (pos[0] * 100, pos[1] * 100, 100, 100), 2)
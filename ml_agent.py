@@ -1,5 +1,4 @@
 import random
-import math
 
 class BaseAgent:
     def __init__(self, game, x, y, agent_type):
@@ -18,20 +17,20 @@ class BaseAgent:
 
     def update_seeker(self):
         # Find closest hider
-        hiders = [npc for npc in self.game.ml_agents if npc.agent_type == 'hider' and npc.alive]
+        hiders = self.game.agent_index.nearest(self.x, self.y, 1, lambda a: a.agent_type == 'hider' and a.alive)
         if not hiders:
             return
 
-        closest_hider = min(hiders, key=lambda h: math.hypot(h.x - self.x, h.y - self.y))
+        closest_hider = hiders[0][0]
         self.move_towards(closest_hider.x, closest_hider.y)
 
     def update_hider(self):
         # Try to move away from nearest seeker
-        seekers = [npc for npc in self.game.ml_agents if npc.agent_type == 'seeker' and npc.alive]
+        seekers = self.game.agent_index.nearest(self.x, self.y, 1, lambda a: a.agent_type == 'seeker' and a.alive)
         if not seekers:
             return
 
-        closest_seeker = min(seekers, key=lambda s: math.hypot(s.x - self.x, s.y - self.y))
+        closest_seeker = seekers[0][0]
         dx = self.x - closest_seeker.x
         dy = self.y - closest_seeker.y
         target_x = self.x + (1 if dx > 0 else -1)
@@ -1,11 +1,38 @@
-import csv
-import os
+import atexit
+import queue
+import threading
+import time
 from datetime import datetime
+from settings import LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, LOG_FORMAT, LOG_SHARD_DIR
+from log_shards import ShardedLog, open_log
+
+# loggers whose writer thread still runs, closed and flushed at exit; a closed
+# logger leaves once its thread has written the last rows
+running_loggers = set()
+
+
+def close_loggers():
+    for logger in list(running_loggers):
+        logger.close()
+
+
+atexit.register(close_loggers)
+
 
 class AssistantLogger:
+    """
+    Rows are queued by log() and written in batches by a background thread, once
+    batch_size rows are waiting or the oldest has waited flush_interval seconds,
+    so the game thread never waits on the disk. close() writes what is left.
+    Rows go to rotated shards in shard_dir, or to a single filename, as CSV or,
+    with log_format='columnar', as a ColumnarLog.
+    """
 
         # In ml_logger.py, add any additional fields that might be useful
-    def __init__(self, filename="assistant_logs.csv"):
+    def __init__(self, filename=None, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL,
+                 log_format=LOG_FORMAT, shard_dir=LOG_SHARD_DIR):
+        if filename is None and not shard_dir:
+            filename = "assistant_logs.alog" if log_format == 'columnar' else "assistant_logs.csv"
         self.filename = filename
         self.fields = [
             "timestamp",
@@ -20,16 +47,20 @@ class AssistantLogger:
             "player_position_y",  # New field
             "advice"
         ]
-        if not os.path.exists(self.filename):
-            with open(self.filename, mode='w', newline='') as file:
-                writer = csv.DictWriter(file, fieldnames=self.fields)
-                writer.writeheader()
+        self.store = open_log(filename, self.fields) if filename else ShardedLog(shard_dir, log_format, fields=self.fields)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name='AssistantLogger', daemon=True)
+        running_loggers.add(self)
+        self.thread.start()
 
     def log(self, player_health, threat_count, closest_enemy_distance, in_fov, is_hidden, 
         player_ammo=0, nearby_health_packs=0, player_position_x=0, player_position_y=0, advice=""):
-        with open(self.filename, mode='a', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=self.fields)
-            writer.writerow({
+        if self.closed:
+            return
+        self.queue.put({
             "timestamp": datetime.now().isoformat(),
             "player_health": player_health,
             "threat_count": threat_count,
@@ -41,4 +72,43 @@ class AssistantLogger:
             "player_position_x": player_position_x,
             "player_position_y": player_position_y,
             "advice": advice
-            })
\ No newline at end of file
+            })
+
+    def close(self, wait=True):
+        # wait=False hands the remaining rows to the writer thread and returns at once
+        if not self.closed:
+            self.closed = True
+            self.queue.put(None)
+        if wait:
+            self.thread.join()
+
+    def run(self):
+        rows = []
+        deadline = None
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if rows else None
+            try:
+                row = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                row = False
+            if row is None:
+                break
+            if row:
+                rows.append(row)
+                if len(rows) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+            if len(rows) >= self.batch_size or rows and time.monotonic() >= deadline:
+                self.write(rows)
+                rows = []
+        if rows:
+            self.write(rows)
+        if isinstance(self.store, ShardedLog):
+            self.store.close()
+        running_loggers.discard(self)
+
+    def write(self, rows):
+        try:
+            self.store.append(rows)
+        except Exception as e:
+            # the writer thread keeps going, or log() would fill the queue without end
+            print(f"Error writing assistant log: {e!r}")
\ No newline at end of file
@@ -13,7 +13,7 @@ class NPC(AnimatedSprite):
         self.walk_images = self.get_images(self.path + '/walk')
 
         self.attack_dist = randint(3, 6)
-        self.speed = 0.03
+        self.speed = 0.001875  # tiles per millisecond
         self.size = 20
         self.health = 100
         self.attack_damage = 10
@@ -23,13 +23,20 @@ class NPC(AnimatedSprite):
         self.ray_cast_value = False
         self.frame_counter = 0
         self.player_search_trigger = False
+        self.prev_x, self.prev_y = self.x, self.y
 
     def update(self):
+        self.prev_x, self.prev_y = self.x, self.y
         self.check_animation_time()
-        self.get_sprite()
+        self.locate(self.x, self.y, self.game.player.x, self.game.player.y, self.game.player.angle)
         self.run_logic()
         # self.draw_ray_cast()
 
+    @property
+    def view_pos(self):
+        alpha = self.game.alpha
+        return self.prev_x + (self.x - self.prev_x) * alpha, self.prev_y + (self.y - self.prev_y) * alpha
+
     def check_wall(self, x, y):
         return (x, y) not in self.game.map.world_map
 
@@ -46,8 +53,8 @@ class NPC(AnimatedSprite):
         # pg.draw.rect(self.game.screen, 'blue', (100 * next_x, 100 * next_y, 100, 100))
         if next_pos not in self.game.object_handler.npc_positions:
             angle = math.atan2(next_y + 0.5 - self.y, next_x + 0.5 - self.x)
-            dx = math.cos(angle) * self.speed
-            dy = math.sin(angle) * self.speed
+            dx = math.cos(angle) * self.speed * self.game.delta_time
+            dy = math.sin(angle) * self.speed * self.game.delta_time
             self.check_wall_collision(dx, dy)
 
     def attack(self):
@@ -59,9 +66,8 @@ class NPC(AnimatedSprite):
     def animate_death(self):
         if not self.alive:
             if self.game.global_trigger and self.frame_counter < len(self.death_images) - 1:
-                self.death_images.rotate(-1)
-                self.image = self.death_images[0]
                 self.frame_counter += 1
+                self.image = self.death_images[self.frame_counter]
 
     def animate_pain(self):
         self.animate(self.pain_images)
@@ -84,7 +90,7 @@ class NPC(AnimatedSprite):
 
     def run_logic(self):
         if self.alive:
-            self.ray_cast_value = self.ray_cast_player_npc()
+            self.ray_cast_value = self.game.visibility.is_visible(self)
             self.check_hit_in_npc()
 
             if self.pain:
@@ -113,73 +119,9 @@ class NPC(AnimatedSprite):
     def map_pos(self):
         return int(self.x), int(self.y)
 
-    def ray_cast_player_npc(self):
-        if self.game.player.map_pos == self.map_pos:
-            return True
-
-        wall_dist_v, wall_dist_h = 0, 0
-        player_dist_v, player_dist_h = 0, 0
-
-        ox, oy = self.game.player.pos
-        x_map, y_map = self.game.player.map_pos
-
-        ray_angle = self.theta
-
-        sin_a = math.sin(ray_angle)
-        cos_a = math.cos(ray_angle)
-
-        # horizontals
-        y_hor, dy = (y_map + 1, 1) if sin_a > 0 else (y_map - 1e-6, -1)
-
-        depth_hor = (y_hor - oy) / sin_a
-        x_hor = ox + depth_hor * cos_a
-
-        delta_depth = dy / sin_a
-        dx = delta_depth * cos_a
-
-        for i in range(MAX_DEPTH):
-            tile_hor = int(x_hor), int(y_hor)
-            if tile_hor == self.map_pos:
-                player_dist_h = depth_hor
-                break
-            if tile_hor in self.game.map.world_map:
-                wall_dist_h = depth_hor
-                break
-            x_hor += dx
-            y_hor += dy
-            depth_hor += delta_depth
-
-        # verticals
-        x_vert, dx = (x_map + 1, 1) if cos_a > 0 else (x_map - 1e-6, -1)
-
-        depth_vert = (x_vert - ox) / cos_a
-        y_vert = oy + depth_vert * sin_a
-
-        delta_depth = dx / cos_a
-        dy = delta_depth * sin_a
-
-        for i in range(MAX_DEPTH):
-            tile_vert = int(x_vert), int(y_vert)
-            if tile_vert == self.map_pos:
-                player_dist_v = depth_vert
-                break
-            if tile_vert in self.game.map.world_map:
-                wall_dist_v = depth_vert
-                break
-            x_vert += dx
-            y_vert += dy
-            depth_vert += delta_depth
-
-        player_dist = max(player_dist_v, player_dist_h)
-        wall_dist = max(wall_dist_v, wall_dist_h)
-
-        if 0 < player_dist < wall_dist or not wall_dist:
-            return True
-        return False
-
     def draw_ray_cast(self):
         pg.draw.circle(self.game.screen, 'red', (100 * self.x, 100 * self.y), 15)
-        if self.ray_cast_player_npc():
+        if self.game.visibility.is_visible(self):
             pg.draw.line(self.game.screen, 'orange', (100 * self.game.player.x, 100 * self.game.player.y),
                          (100 * self.x, 100 * self.y), 2)
 
@@ -196,7 +138,7 @@ class CacoDemonNPC(NPC):
         self.attack_dist = 1.0
         self.health = 150
         self.attack_damage = 25
-        self.speed = 0.05
+        self.speed = 0.003125
         self.accuracy = 0.35
 
 class CyberDemonNPC(NPC):
@@ -206,7 +148,7 @@ class CyberDemonNPC(NPC):
         self.attack_dist = 6
         self.health = 350
         self.attack_damage = 15
-        self.speed = 0.055
+        self.speed = 0.0034375
         self.accuracy = 0.25
 
 
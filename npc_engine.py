@@ -0,0 +1,295 @@
+import math
+import numpy as np
+from random import random
+from sprite_object import *
+
+IDLE, WALK, ATTACK, PAIN, DEATH = range(5)
+
+
+def engine_field(name):
+    def get(self):
+        return self.engine.fields[name][self.index].item()
+
+    def set(self, value):
+        self.engine.fields[name][self.index] = value
+    return property(get, set)
+
+
+class NPCView(SpriteObject):
+    """
+    An npc of the array engine. Its state lives in the engine's arrays, the view only
+    exposes it under the NPC attribute names for the assistant, visibility and renderer.
+    """
+    x = engine_field('x')
+    y = engine_field('y')
+    alive = engine_field('alive')
+    health = engine_field('health')
+    pain = engine_field('pain')
+    dist = engine_field('dist')
+    attack_dist = engine_field('attack_dist')
+    ray_cast_value = engine_field('visible')
+    player_search_trigger = engine_field('search')
+
+    def __init__(self, engine, index, npc):
+        self.engine = engine
+        self.index = index
+        self.kind = engine.get_kind(npc)
+        self.game = npc.game
+        self.player = npc.player
+        self.path = npc.path
+        self.IMAGE_WIDTH = npc.IMAGE_WIDTH
+        self.IMAGE_HALF_WIDTH = npc.IMAGE_HALF_WIDTH
+        self.IMAGE_RATIO = npc.IMAGE_RATIO
+        self.SPRITE_SCALE = npc.SPRITE_SCALE
+        self.SPRITE_HEIGHT_SHIFT = npc.SPRITE_HEIGHT_SHIFT
+        self.dx, self.dy, self.theta, self.screen_x, self.norm_dist = 0, 0, 0, 0, 1
+        self.sprite_half_width = 0
+
+    @property
+    def image(self):
+        fields = self.engine.fields
+        state, frame = fields['image_state'][self.index], fields['image_frame'][self.index]
+        frames = self.engine.frames[self.kind]
+        if state < 0:
+            return frames[state]
+        return frames[state][frame % len(frames[state])]
+
+    @property
+    def map_pos(self):
+        return int(self.x), int(self.y)
+
+    @property
+    def view_pos(self):
+        fields, i, alpha = self.engine.fields, self.index, self.game.alpha
+        x, y = fields['x'][i], fields['y'][i]
+        return (fields['prev_x'][i] + (x - fields['prev_x'][i]) * alpha,
+                fields['prev_y'][i] + (y - fields['prev_y'][i]) * alpha)
+
+
+class NPCEngine:
+    """
+    Structure of arrays npc population (NPC_ENGINE = 'arrays'). Positions, health, state,
+    timers and type parameters are numpy arrays, and one simulation step advances
+    animation, line of sight, hits, attacks and movement for every npc in batches.
+    NPC objects are only built to read their type parameters, then replaced by views.
+    """
+    float_fields = ('x', 'y', 'prev_x', 'prev_y', 'speed', 'size', 'accuracy',
+                    'attack_dist', 'scale', 'ratio', 'half_image_width', 'screen_x', 'dist', 'sprite_half_width')
+    int_fields = ('kind', 'health', 'attack_damage', 'animation_time', 'animation_time_prev', 'frame_index', 'frame_counter',
+                  'image_state', 'image_frame', 'cell_x', 'cell_y')
+    bool_fields = ('alive', 'pain', 'search', 'visible', 'trigger', 'indexed')
+
+    def __init__(self, game):
+        self.game = game
+        self.fields = {name: np.zeros(0, dtype=np.float64) for name in self.float_fields}
+        self.fields.update({name: np.zeros(0, dtype=np.int64) for name in self.int_fields})
+        self.fields.update({name: np.zeros(0, dtype=bool) for name in self.bool_fields})
+        # the fields are views of these arrays, which double in capacity when full
+        self.storage = dict(self.fields)
+        self.views = []
+        # per kind: idle, walk, attack, pain and death frames, then the still image at index -1
+        self.kinds = {}
+        self.frames = []
+        self.view_classes = {}
+        self.grid = np.frombuffer(game.map.grid, dtype=np.uint8).reshape(game.map.rows, game.map.cols)
+
+    def get_kind(self, npc):
+        kind = self.kinds.get(type(npc))
+        if kind is None:
+            kind = self.kinds[type(npc)] = len(self.frames)
+            self.frames.append((npc.idle_images, npc.walk_images, npc.attack_images, npc.pain_images,
+                                npc.death_images, npc.image))
+        return kind
+
+    def add(self, npc):
+        index = len(self.views)
+        # a view class per npc class keeps type names such as 'CacoDemon' visible to the assistant
+        view_class = self.view_classes.get(type(npc))
+        if view_class is None:
+            view_class = self.view_classes[type(npc)] = type(type(npc).__name__ + 'View', (NPCView,), {})
+        view = view_class(self, index, npc)
+
+        values = dict(x=npc.x, y=npc.y, prev_x=npc.x, prev_y=npc.y, speed=npc.speed, size=npc.size,
+                      health=npc.health, attack_damage=npc.attack_damage, accuracy=npc.accuracy,
+                      attack_dist=npc.attack_dist, scale=npc.SPRITE_SCALE, ratio=npc.IMAGE_RATIO,
+                      half_image_width=npc.IMAGE_HALF_WIDTH, dist=1, kind=view.kind,
+                      animation_time=npc.animation_time, animation_time_prev=npc.animation_time_prev,
+                      image_state=-1, alive=True)
+        for name, array in self.fields.items():
+            store = self.storage[name]
+            if len(store) == index:
+                store = self.storage[name] = np.zeros(max(2 * index, 64), dtype=array.dtype)
+                store[:index] = array
+            elif array.base is not store:
+                # a step replaced the field with a new array
+                store[:index] = array
+            store[index] = values.get(name, 0)
+            self.fields[name] = store[:index + 1]
+        self.views.append(view)
+        return view
+
+    def is_wall(self, x, y):
+        rows, cols = self.grid.shape
+        inside = (x >= 0) & (x < cols) & (y >= 0) & (y < rows)
+        return inside & (self.grid[np.clip(y, 0, rows - 1), np.clip(x, 0, cols - 1)] > 0)
+
+    def locate(self, x, y, player_x, player_y, player_angle):
+        f = self.fields
+        dx = x - player_x
+        dy = y - player_y
+        theta = np.arctan2(dy, dx)
+
+        delta = theta - player_angle
+        delta += np.where((dx > 0) & (player_angle > math.pi) | (dx < 0) & (dy < 0), math.tau, 0)
+
+        screen_x = (HALF_NUM_RAYS + delta / DELTA_ANGLE) * SCALE
+        dist = np.hypot(dx, dy)
+        norm_dist = dist * np.cos(delta)
+        half_width = np.where(norm_dist > 0.5,
+                              SCREEN_DIST / np.maximum(norm_dist, 0.5) * f['scale'] * f['ratio'] // 2,
+                              f['sprite_half_width'])
+        return screen_x, dist, norm_dist, half_width
+
+    def animate(self, mask, state):
+        f = self.fields
+        mask = mask & f['trigger']
+        f['frame_index'][mask] += 1
+        f['image_state'][mask] = state
+        f['image_frame'][mask] = f['frame_index'][mask]
+
+    def update(self):
+        if not self.views:
+            return
+        f = self.fields
+        game, player = self.game, self.game.player
+        f['prev_x'][:] = f['x']
+        f['prev_y'][:] = f['y']
+
+        time_now = game.get_ticks()
+        f['trigger'] = time_now - f['animation_time_prev'] > f['animation_time']
+        f['animation_time_prev'][f['trigger']] = time_now
+
+        f['screen_x'], f['dist'], _, f['sprite_half_width'] = self.locate(
+            f['x'], f['y'], player.x, player.y, player.angle)
+
+        alive = f['alive'].copy()
+        live = np.flatnonzero(alive)
+        f['visible'][:] = False
+        f['visible'][live] = game.visibility.cast_points(f['x'][live], f['y'][live])
+        game.visibility.visible = {self.views[i]: bool(f['visible'][i]) for i in live}
+        visible = f['visible']
+
+        # the shot hits the first live npc in the crosshair, as the per-object loop did
+        if player.shot:
+            in_sight = alive & visible & (np.abs(f['screen_x'] - HALF_WIDTH) < f['sprite_half_width'])
+            if in_sight.any():
+                i = in_sight.argmax()
+                game.sound.npc_pain.play()
+                player.shot = False
+                f['pain'][i] = True
+                f['health'][i] -= game.weapon.damage
+                if f['health'][i] < 1:
+                    f['alive'][i] = False
+                    game.sound.npc_death.play()
+
+        pain = alive & f['pain']
+        self.animate(pain, PAIN)
+        f['pain'][pain & f['trigger']] = False
+
+        calm = alive & ~pain
+        f['search'] |= calm & visible
+        attacking = calm & visible & (f['dist'] < f['attack_dist'])
+        walking = calm & f['search'] & ~attacking
+        self.animate(attacking, ATTACK)
+        self.animate(walking, WALK)
+        self.animate(calm & ~f['search'], IDLE)
+
+        for i in np.flatnonzero(attacking & f['trigger']):
+            game.sound.npc_shot.play()
+            if random() < f['accuracy'][i]:
+                player.get_damage(int(f['attack_damage'][i]))
+
+        self.move(np.flatnonzero(walking))
+        self.animate_death(~alive)
+        self.track()
+
+    def move(self, walkers):
+        if not len(walkers):
+            return
+        f = self.fields
+        game = self.game
+        x, y = f['x'][walkers], f['y'][walkers]
+        tile_x, tile_y = x.astype(np.int64), y.astype(np.int64)
+
+        goal = game.player.map_pos
+        if PATHFINDING_MODE == 'flow_field':
+            next_tiles = game.pathfinding.get_flow_grid(goal)[tile_y, tile_x]
+            next_x, next_y = next_tiles[:, 0], next_tiles[:, 1]
+        else:
+            next_x, next_y = np.array([game.pathfinding.get_path(tile, goal)
+                                       for tile in zip(tile_x.tolist(), tile_y.tolist())]).T.reshape(2, -1)
+
+        # occupied next tiles hold the npc back, like npc_positions does for NPC objects
+        rows, cols = self.grid.shape
+        live = f['alive']
+        occupancy = np.bincount((f['y'][live].astype(np.int64) * cols + f['x'][live].astype(np.int64)),
+                                minlength=rows * cols)
+        free = occupancy[np.clip(next_y, 0, rows - 1) * cols + np.clip(next_x, 0, cols - 1)] == 0
+        walkers, x, y, next_x, next_y = walkers[free], x[free], y[free], next_x[free], next_y[free]
+
+        angle = np.arctan2(next_y + 0.5 - y, next_x + 0.5 - x)
+        step = f['speed'][walkers] * game.delta_time
+        dx, dy = np.cos(angle) * step, np.sin(angle) * step
+        size = f['size'][walkers]
+        x = np.where(self.is_wall((x + dx * size).astype(np.int64), y.astype(np.int64)), x, x + dx)
+        y = np.where(self.is_wall(x.astype(np.int64), (y + dy * size).astype(np.int64)), y, y + dy)
+        f['x'][walkers], f['y'][walkers] = x, y
+
+    def animate_death(self, dead):
+        f = self.fields
+        if not self.game.global_trigger:
+            return
+        death_frames = np.array([len(frames[DEATH]) for frames in self.frames])[f['kind']]
+        advance = dead & (f['frame_counter'] < death_frames - 1)
+        f['frame_counter'][advance] += 1
+        f['image_state'][advance] = DEATH
+        f['image_frame'][advance] = f['frame_counter'][advance]
+
+    def track(self):
+        # occupied tiles and proximity index, only touching npcs that changed cell or died
+        f = self.fields
+        handler = self.game.object_handler
+        live = f['alive']
+        tiles = set(zip(f['x'][live].astype(np.int64).tolist(), f['y'][live].astype(np.int64).tolist()))
+        if tiles != handler.npc_positions:
+            handler.npc_positions = tiles
+            handler.occupancy_version += 1
+
+        index = handler.npc_index
+        cell_x = (f['x'] // index.cell_size).astype(np.int64)
+        cell_y = (f['y'] // index.cell_size).astype(np.int64)
+        moved = live & (~f['indexed'] | (cell_x != f['cell_x']) | (cell_y != f['cell_y']))
+        for i in np.flatnonzero(moved):
+            index.move(self.views[i])
+        for i in np.flatnonzero(~live & f['indexed']):
+            index.remove(self.views[i])
+        f['cell_x'], f['cell_y'] = cell_x, cell_y
+        f['indexed'] = live.copy()
+
+    def render(self):
+        if not self.views:
+            return
+        f = self.fields
+        player = self.game.player
+        alpha = self.game.alpha
+        x = f['prev_x'] + (f['x'] - f['prev_x']) * alpha
+        y = f['prev_y'] + (f['y'] - f['prev_y']) * alpha
+        px, py = player.view_pos
+        screen_x, _, norm_dist, _ = self.locate(x, y, px, py, player.view_angle)
+
+        on_screen = ((-f['half_image_width'] < screen_x) & (screen_x < WIDTH + f['half_image_width']) &
+                     (norm_dist > 0.5))
+        for i in np.flatnonzero(on_screen):
+            view = self.views[i]
+            view.screen_x, view.norm_dist = screen_x[i], norm_dist[i]
+            view.get_sprite_projection()
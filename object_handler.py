@@ -1,10 +1,13 @@
 from sprite_object import *
 from npc import *
+from spatial import SpatialHash
+from npc_engine import NPCEngine
+from lod import ActivityScheduler
 from random import choices, randrange
 
 
 class ObjectHandler:
-    def __init__(self, game):
+    def __init__(self, game, npc_engine=NPC_ENGINE):
         self.game = game
         self.sprite_list = []
         self.npc_list = []
@@ -13,7 +16,14 @@ class ObjectHandler:
         self.anim_sprite_path = 'resources/sprites/animated_sprites/'
         add_sprite = self.add_sprite
         add_npc = self.add_npc
-        self.npc_positions = {}
+        # tiles occupied by live npcs, kept up to date as each npc moves or dies
+        self.npc_positions = set()
+        self.npc_tiles = {}
+        self.tile_counts = {}
+        self.occupancy_version = 0
+        self.npc_index = SpatialHash()
+        self.npc_engine = NPCEngine(game) if npc_engine == 'arrays' else None
+        self.scheduler = ActivityScheduler(game)
 
         # spawn npc
         self.enemies = 20  # npc count
@@ -60,25 +70,65 @@ class ObjectHandler:
         for i in range(self.enemies):
                 npc = choices(self.npc_types, self.weights)[0]
                 pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
-                while (pos in self.game.map.world_map) or (pos in self.restricted_area):
+                while self.game.map.is_wall(x, y) or (pos in self.restricted_area):
                     pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
                 self.add_npc(npc(self.game, pos=(x + 0.5, y + 0.5)))
 
     def check_win(self):
         if not len(self.npc_positions):
-            self.game.object_renderer.win()
-            pg.display.flip()
-            pg.time.delay(1500)
+            if not self.game.headless:
+                self.game.object_renderer.win()
+                pg.display.flip()
+                pg.time.delay(1500)
             self.game.new_game()
 
     def update(self):
-        self.npc_positions = {npc.map_pos for npc in self.npc_list if npc.alive}
-        [sprite.update() for sprite in self.sprite_list]
-        [npc.update() for npc in self.npc_list]
+        if self.npc_engine:
+            self.npc_engine.update()
+            self.check_win()
+            return
+        for npc in self.scheduler.awake:
+            alive = npc.alive
+            npc.update()
+            if alive:
+                self.track_npc(npc)
         self.check_win()
 
+    def track_npc(self, npc):
+        old_tile = self.npc_tiles.get(npc)
+        tile = npc.map_pos if npc.alive else None
+        if tile != old_tile:
+            # cached paths were searched around the old positions
+            if old_tile is not None:
+                self.tile_counts[old_tile] -= 1
+                if not self.tile_counts[old_tile]:
+                    del self.tile_counts[old_tile]
+                    self.npc_positions.discard(old_tile)
+                    self.occupancy_version += 1
+                del self.npc_tiles[npc]
+            if tile is not None:
+                self.npc_tiles[npc] = tile
+                self.tile_counts[tile] = self.tile_counts.get(tile, 0) + 1
+                if tile not in self.npc_positions:
+                    self.npc_positions.add(tile)
+                    self.occupancy_version += 1
+        if npc.alive:
+            self.npc_index.move(npc)
+        else:
+            self.npc_index.remove(npc)
+
+    def render(self):
+        [sprite.update() for sprite in self.sprite_list]
+        if self.npc_engine:
+            self.npc_engine.render()
+        else:
+            [npc.get_sprite() for npc in self.npc_list]
+
     def add_npc(self, npc):
+        if self.npc_engine:
+            npc = self.npc_engine.add(npc)
         self.npc_list.append(npc)
+        self.track_npc(npc)
 
     def add_sprite(self, sprite):
         self.sprite_list.append(sprite)
\ No newline at end of file
@@ -1,5 +1,7 @@
 import pygame as pg
+import numpy as np
 from settings import *
+from assets import assets
 
 
 class ObjectRenderer:
@@ -9,6 +11,8 @@ class ObjectRenderer:
         self.wall_textures = self.load_wall_textures()
         self.sky_image = self.get_texture('resources/textures/sky.png', (WIDTH, HALF_HEIGHT))
         self.sky_offset = 0
+        # sky pixels per radian of view angle
+        self.sky_scroll = 4.5 / (MOUSE_SENSITIVITY * SIM_DELTA_TIME)
         self.blood_screen = self.get_texture('resources/textures/blood_screen.png', RES)
         self.digit_size = 90
         self.digit_images = [self.get_texture(f'resources/textures/digits/{i}.png', [self.digit_size] * 2)
@@ -16,10 +20,14 @@ class ObjectRenderer:
         self.digits = dict(zip(map(str, range(11)), self.digit_images))
         self.game_over_image = self.get_texture('resources/textures/game_over.png', RES)
         self.win_image = self.get_texture('resources/textures/win.png', RES)
+        self.framebuffer = FramebufferRenderer(game, self) if RENDERER == 'framebuffer' else None
 
     def draw(self):
-        self.draw_background()
-        self.render_game_objects()
+        if self.framebuffer:
+            self.framebuffer.draw()
+        else:
+            self.draw_background()
+            self.render_game_objects()
         self.draw_player_health()
 
     def win(self):
@@ -37,22 +45,32 @@ class ObjectRenderer:
     def player_damage(self):
         self.screen.blit(self.blood_screen, (0, 0))
 
+    def update_sky_offset(self):
+        # follows the view angle so the sky scrolls the same at any frame rate
+        self.sky_offset = self.sky_scroll * self.game.player.view_angle % WIDTH
+
     def draw_background(self):
-        self.sky_offset = (self.sky_offset + 4.5 * self.game.player.rel) % WIDTH
+        self.update_sky_offset()
         self.screen.blit(self.sky_image, (-self.sky_offset, 0))
         self.screen.blit(self.sky_image, (-self.sky_offset + WIDTH, 0))
         # floor
         pg.draw.rect(self.screen, FLOOR_COLOR, (0, HALF_HEIGHT, WIDTH, HEIGHT))
 
     def render_game_objects(self):
-        list_objects = sorted(self.game.raycasting.objects_to_render, key=lambda t: t[0], reverse=True)
-        for depth, image, pos in list_objects:
-            self.screen.blit(image, pos)
+        # wall columns never overlap, sprites are clipped against the z-buffer instead of sorted in with them
+        self.screen.blits([(image, pos) for depth, image, pos in self.game.raycasting.objects_to_render], False)
+        self.render_sprites()
+
+    def render_sprites(self):
+        sprites = sorted(self.game.raycasting.sprites_to_render, key=lambda t: t[0], reverse=True)
+        for depth, image, pos, spans in sprites:
+            x, y = int(pos[0]), pos[1]
+            for start, end in spans:
+                self.screen.blit(image, (start, y), (start - x, 0, end - start, image.get_height()))
 
     @staticmethod
     def get_texture(path, res=(TEXTURE_SIZE, TEXTURE_SIZE)):
-        texture = pg.image.load(path).convert_alpha()
-        return pg.transform.scale(texture, res)
+        return assets.get_texture(path, res)
 
     def load_wall_textures(self):
         return {
@@ -61,4 +79,60 @@ class ObjectRenderer:
             3: self.get_texture('resources/textures/3.png'),
             4: self.get_texture('resources/textures/4.png'),
             5: self.get_texture('resources/textures/5.png'),
-        }
\ No newline at end of file
+        }
+
+
+class FramebufferRenderer:
+    def __init__(self, game, renderer):
+        self.game = game
+        self.renderer = renderer
+        self.screen = game.screen
+        # pixels are kept packed in the screen's own format so the frame is a single copy away
+        self.shifts = self.screen.get_shifts()[:3]
+        # all wall texels in one flat array, indexed by (texture id, x, y), loaded once
+        textures = renderer.wall_textures
+        self.textures = np.zeros((max(textures) + 1, TEXTURE_SIZE, TEXTURE_SIZE), dtype=np.uint32)
+        for texture_id, texture in textures.items():
+            self.textures[texture_id] = self.pack(pg.surfarray.array3d(texture))
+        self.textures = self.textures.ravel()
+        self.sky = self.pack(pg.surfarray.array3d(renderer.sky_image))
+        self.floor = self.pack(np.array(FLOOR_COLOR))
+        self.frame = np.empty((WIDTH, HEIGHT), dtype=np.uint32)
+        # one view per ray of the SCALE screen columns it covers
+        self.frame_columns = self.frame.reshape(NUM_RAYS, SCALE, HEIGHT)
+        self.rows = np.arange(HEIGHT, dtype=np.float32)
+
+    def pack(self, rgb):
+        rgb = rgb.astype(np.uint32)
+        return sum(rgb[..., i] << shift for i, shift in enumerate(self.shifts)).astype(np.uint32)
+
+    def draw(self):
+        self.draw_background()
+        self.draw_walls()
+        pg.surfarray.blit_array(self.screen, self.frame)
+        self.renderer.render_sprites()
+
+    def draw_background(self):
+        self.renderer.update_sky_offset()
+        self.frame[:, :HALF_HEIGHT] = np.roll(self.sky, -int(self.renderer.sky_offset), axis=0)
+        # floor
+        self.frame[:, HALF_HEIGHT:] = self.floor
+
+    def draw_walls(self):
+        _, proj_height, texture, offset = np.array(self.game.raycasting.ray_casting_result).T
+
+        # walls are centered on the horizon, so only the band of the tallest one needs work
+        half_band = min(int(proj_height.max()) // 2 + 1, HALF_HEIGHT)
+        band = slice(HALF_HEIGHT - half_band, HALF_HEIGHT + half_band)
+
+        column = (offset * (TEXTURE_SIZE - SCALE)).astype(np.intp)
+        top = (HALF_HEIGHT - proj_height / 2).astype(np.float32)
+        # texture row sampled by every screen row of every ray
+        v = (self.rows[band] - top[:, None]) * (TEXTURE_SIZE / proj_height).astype(np.float32)[:, None]
+        wall = (v >= 0) & (v < TEXTURE_SIZE)
+        v = v.astype(np.intp)
+        np.clip(v, 0, TEXTURE_SIZE - 1, out=v)
+
+        v += ((texture.astype(np.intp) * TEXTURE_SIZE + column) * TEXTURE_SIZE)[:, None]
+        texels = self.textures.take(v)
+        np.copyto(self.frame_columns[:, :, band], texels[:, None], where=wall[:, None])
@@ -1,5 +1,10 @@
+import math
+import numpy as np
 from collections import deque
-from functools import lru_cache
+from heapq import heappush, heappop
+from settings import *
+from hpa import HierarchicalPathFinding
+from lru import LRUCache
 
 
 class PathFinding:
@@ -9,10 +14,34 @@ class PathFinding:
         self.ways = [-1, 0], [0, -1], [1, 0], [0, 1], [-1, -1], [1, -1], [1, 1], [-1, 1]
         self.graph = {}
         self.get_graph()
+        # next steps found by bfs, only valid for the npc occupancy they were searched with
+        self.path_cache = LRUCache(PATH_CACHE_SIZE)
+        self.cache_version = None
+        # next step towards a goal for every reachable cell, shared by all agents heading there
+        self.flow_fields = LRUCache(FLOW_FIELD_CACHE_SIZE)
+        self.flow_grids = LRUCache(FLOW_FIELD_CACHE_SIZE)
+        self.engine = self.get_flow_step if PATHFINDING_MODE == 'flow_field' else self.get_search_step
+        self.search = self.astar if PATHFINDING_MODE == 'astar' else self.bfs
+        self.hpa = HierarchicalPathFinding(self) if PATHFINDING_MODE == 'hpa' else None
+        self.find_step = self.hpa.get_next_step if self.hpa else self.find_path
 
-    @lru_cache
     def get_path(self, start, goal):
-        self.visited = self.bfs(start, goal, self.graph)
+        return self.engine(start, goal)
+
+    def get_search_step(self, start, goal):
+        version = self.game.object_handler.occupancy_version
+        if version != self.cache_version:
+            self.path_cache.clear()
+            self.cache_version = version
+
+        key = start, goal
+        next_node = self.path_cache.get(key)
+        if next_node is None:
+            next_node = self.path_cache.put(key, self.find_step(start, goal))
+        return next_node
+
+    def find_path(self, start, goal):
+        self.visited = self.search(start, goal, self.graph)
         path = [goal]
         step = self.visited.get(goal, start)
 
@@ -21,6 +50,46 @@ class PathFinding:
             step = self.visited[step]
         return path[-1]
 
+    def get_flow_step(self, start, goal):
+        return self.get_flow_field(goal).get(start, goal)
+
+    def get_flow_field(self, goal):
+        flow_field = self.flow_fields.get(goal)
+        if flow_field is None:
+            flow_field = self.flow_fields.put(goal, self.reverse_bfs(goal, self.graph))
+        return flow_field
+
+    def get_flow_grid(self, goal):
+        # the flow field as a (rows, cols, 2) array of next steps, for batched lookups
+        flow_grid = self.flow_grids.get(goal)
+        if flow_grid is None:
+            flow_grid = np.empty((self.game.map.rows, self.game.map.cols, 2), dtype=np.int64)
+            flow_grid[...] = goal
+            for (x, y), next_node in self.get_flow_field(goal).items():
+                flow_grid[y, x] = next_node
+            self.flow_grids.put(goal, flow_grid)
+        return flow_grid
+
+    def reverse_bfs(self, goal, graph):
+        # the graph is undirected, so the bfs parent of a cell is its next step towards goal.
+        # npc positions are left out, npc movement already waits for an occupied next step
+        queue = deque([goal])
+        flow_field = {goal: goal}
+
+        while queue:
+            cur_node = queue.popleft()
+            for next_node in graph.get(cur_node, ()):
+                if next_node not in flow_field:
+                    queue.append(next_node)
+                    flow_field[next_node] = cur_node
+        return flow_field
+
+    def clear_cache(self):
+        self.path_cache.clear()
+        self.cache_version = None
+        self.flow_fields.clear()
+        self.flow_grids.clear()
+
     def bfs(self, start, goal, graph):
         queue = deque([start])
         visited = {start: None}
@@ -29,7 +98,8 @@ class PathFinding:
             cur_node = queue.popleft()
             if cur_node == goal:
                 break
-            next_nodes = graph[cur_node]
+            # a start off the graph, an npc pushed into a wall corner, has no steps
+            next_nodes = graph.get(cur_node, ())
 
             for next_node in next_nodes:
                 if next_node not in visited and next_node not in self.game.object_handler.npc_positions:
@@ -37,8 +107,51 @@ class PathFinding:
                     visited[next_node] = cur_node
         return visited
 
+    def astar(self, start, goal, graph):
+        # straight steps cost 1 and diagonal steps sqrt(2), the octile distance never overestimates
+        queue = [(0, 0, start)]
+        visited = {start: None}
+        costs = {start: 0}
+        goal_x, goal_y = goal
+        diagonal = math.sqrt(2)
+        occupied = self.game.object_handler.npc_positions
+
+        while queue:
+            _, cur_cost, cur_node = heappop(queue)
+            if cur_node == goal:
+                break
+            if cur_cost > costs[cur_node]:
+                continue
+            x, y = cur_node
+
+            for next_node in graph.get(cur_node, ()):
+                next_x, next_y = next_node
+                next_cost = cur_cost + (diagonal if next_x != x and next_y != y else 1)
+                if next_cost < costs.get(next_node, math.inf) and next_node not in occupied:
+                    costs[next_node] = next_cost
+                    visited[next_node] = cur_node
+                    dx, dy = abs(next_x - goal_x), abs(next_y - goal_y)
+                    heappush(queue, (next_cost + dx + dy + (diagonal - 2) * min(dx, dy), next_cost, next_node))
+        return visited
+
     def get_next_nodes(self, x, y):
-        return [(x + dx, y + dy) for dx, dy in self.ways if (x + dx, y + dy) not in self.game.map.world_map]
+        world_map = self.game.map.world_map
+        # no diagonal step past the corner of a wall
+        return [(x + dx, y + dy) for dx, dy in self.ways if (x + dx, y + dy) not in world_map and
+                not (dx and dy and ((x + dx, y) in world_map or (x, y + dy) in world_map))]
+
+    def update_tile(self, x, y):
+        # a tile only changes the edges of the 3x3 block around it, diagonals included
+        game_map = self.game.map
+        for j in range(max(y - 1, 0), min(y + 2, game_map.rows)):
+            for i in range(max(x - 1, 0), min(x + 2, game_map.cols)):
+                if game_map.is_wall(i, j):
+                    self.graph.pop((i, j), None)
+                else:
+                    self.graph[(i, j)] = self.get_next_nodes(i, j)
+        self.clear_cache()
+        if self.hpa:
+            self.hpa.update_tile(x, y)
 
     def get_graph(self):
         for y, row in enumerate(self.map):
@@ -8,11 +8,12 @@ class Player:
         self.game = game
         self.x, self.y = PLAYER_POS
         self.angle = PLAYER_ANGLE
+        self.prev_x, self.prev_y, self.prev_angle = self.x, self.y, self.angle
         self.shot = False
         self.health = PLAYER_MAX_HEALTH
         self.rel = 0
         self.health_recovery_delay = 700
-        self.time_prev = pg.time.get_ticks()
+        self.time_prev = self.game.get_ticks()
         # diagonal movement correction
         self.diag_move_corr = 1 / math.sqrt(2)
 
@@ -21,16 +22,17 @@ class Player:
             self.health += 1
 
     def check_health_recovery_delay(self):
-        time_now = pg.time.get_ticks()
+        time_now = self.game.get_ticks()
         if time_now - self.time_prev > self.health_recovery_delay:
             self.time_prev = time_now
             return True
 
     def check_game_over(self):
         if self.health < 1:
-            self.game.object_renderer.game_over()
-            pg.display.flip()
-            pg.time.delay(1500)
+            if not self.game.headless:
+                self.game.object_renderer.game_over()
+                pg.display.flip()
+                pg.time.delay(1500)
             self.game.new_game()
 
     def get_damage(self, damage):
@@ -39,12 +41,11 @@ class Player:
         self.game.sound.player_pain.play()
         self.check_game_over()
 
-    def single_fire_event(self, event):
-        if event.type == pg.MOUSEBUTTONDOWN:
-            if event.button == 1 and not self.shot and not self.game.weapon.reloading:
-                self.game.sound.shotgun.play()
-                self.shot = True
-                self.game.weapon.reloading = True
+    def single_fire(self):
+        if not self.shot and not self.game.weapon.reloading:
+            self.game.sound.shotgun.play()
+            self.shot = True
+            self.game.weapon.reloading = True
 
     def movement(self):
         sin_a = math.sin(self.angle)
@@ -54,7 +55,7 @@ class Player:
         speed_sin = speed * sin_a
         speed_cos = speed * cos_a
 
-        keys = pg.key.get_pressed()
+        keys = self.game.controller.pressed
         num_key_pressed = -1
         if keys[pg.K_w]:
             num_key_pressed += 1
@@ -103,14 +104,18 @@ class Player:
         pg.draw.circle(self.game.screen, 'green', (self.x * 100, self.y * 100), 15)
 
     def mouse_control(self):
-        mx, my = pg.mouse.get_pos()
-        if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
-            pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
-        self.rel = pg.mouse.get_rel()[0]
+        self.rel = self.game.controller.rel
         self.rel = max(-MOUSE_MAX_REL, min(MOUSE_MAX_REL, self.rel))
         self.angle += self.rel * MOUSE_SENSITIVITY * self.game.delta_time
 
+    def fire_control(self):
+        if self.game.controller.fire:
+            self.game.controller.fire = False
+            self.single_fire()
+
     def update(self):
+        self.prev_x, self.prev_y, self.prev_angle = self.x, self.y, self.angle
+        self.fire_control()
         self.movement()
         self.mouse_control()
         self.recover_health()
@@ -121,4 +126,15 @@ class Player:
 
     @property
     def map_pos(self):
-        return int(self.x), int(self.y)
\ No newline at end of file
+        return int(self.x), int(self.y)
+
+    # position and angle interpolated between the last two simulation steps, for rendering
+    @property
+    def view_pos(self):
+        alpha = self.game.alpha
+        return self.prev_x + (self.x - self.prev_x) * alpha, self.prev_y + (self.y - self.prev_y) * alpha
+
+    @property
+    def view_angle(self):
+        turn = (self.angle - self.prev_angle + math.pi) % math.tau - math.pi
+        return (self.prev_angle + turn * self.game.alpha) % math.tau
\ No newline at end of file
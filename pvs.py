@@ -0,0 +1,117 @@
+import hashlib
+import os
+import zlib
+import numpy as np
+from settings import *
+
+
+class PotentiallyVisibleSet:
+    """
+    Cell to cell visibility of the static map, one bitset per walkable cell over the
+    walkable cells, built offline by casting the line of sight rays between sample
+    points of every pair of them (python pvs.py). Stored zlib compressed in PVS_PATH
+    and loaded on first use. Wall cells are left to the exact test.
+    """
+    magic = b'PVS2'
+    samples = 0.01, 0.25, 0.5, 0.75, 0.99
+    block_cells = 512  # target cells cast at once while building
+
+    def __init__(self, visibility, path=PVS_PATH):
+        self.visibility = visibility
+        self.game = visibility.game
+        self.path = path
+        self.bits = None
+        # map cell -> walkable cell index, -1 for walls
+        self.index = None
+        self.loaded = False
+        self.version = None
+
+    def get_key(self):
+        game_map = self.game.map
+        key = hashlib.sha1(f'{game_map.cols} {game_map.rows} {MAX_DEPTH} {self.samples} '.encode())
+        key.update(bytes(game_map.grid))
+        return key.digest()
+
+    def get_index(self):
+        game_map = self.game.map
+        walls = np.frombuffer(game_map.grid, dtype=np.uint8) != 0
+        index = np.full(len(walls), -1, dtype=np.int64)
+        index[~walls] = np.arange(np.count_nonzero(~walls))
+        return index
+
+    def load(self):
+        self.loaded = True
+        self.version = self.game.map.version
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return
+        header = self.magic + self.get_key()
+        if not data.startswith(header):
+            # built for another layout
+            return
+        self.index = self.get_index()
+        size = int(self.index.max()) + 1
+        self.bits = np.frombuffer(zlib.decompress(data[len(header):]), dtype=np.uint8).reshape(size, -1)
+
+    def may_see(self, x, y, target_x, target_y):
+        # mask of the targets whose cells may be visible from cell (x, y), None when unknown
+        if not self.loaded:
+            self.load()
+        if self.bits is None or self.game.map.version != self.version:
+            return None
+        cols = self.game.map.cols
+        source = self.index[y * cols + x]
+        if source < 0:
+            return None
+        target = self.index[target_y * cols + target_x]
+        row = self.bits[source]
+        return (target < 0) | ((row[target >> 3] >> (7 - (target & 7))) & 1 == 1)
+
+    def build(self):
+        # one packed row per walkable cell, so memory grows with walkable cells squared over 8
+        game_map = self.game.map
+        self.index = self.get_index()
+        cells = np.flatnonzero(self.index >= 0)
+        walkable = np.stack([cells % game_map.cols, cells // game_map.cols], axis=1)
+        offsets = np.array([(sx, sy) for sy in self.samples for sx in self.samples])
+
+        self.bits = np.zeros((len(cells), (len(cells) + 7) // 8), dtype=np.uint8)
+        visible = np.zeros(len(cells), dtype=bool)
+        for source, (x, y) in enumerate(walkable):
+            origins = (x, y) + offsets
+            for first in range(0, len(cells), self.block_cells):
+                block = walkable[first:first + self.block_cells]
+                targets = (block[:, None, :] + offsets[None, :, :]).reshape(-1, 2)
+                ox = np.repeat(origins[:, 0], len(targets))
+                oy = np.repeat(origins[:, 1], len(targets))
+                tx = np.tile(targets[:, 0], len(origins))
+                ty = np.tile(targets[:, 1], len(origins))
+                hits = self.visibility.cast_rays(ox, oy, tx, ty)
+                visible[first:first + len(block)] = hits.reshape(len(origins), len(block), len(offsets)).any(axis=(0, 2))
+            self.bits[source] = np.packbits(visible)
+
+        self.version = game_map.version
+        self.loaded = True
+        return self.bits
+
+    def save(self):
+        with open(self.path + '.tmp', 'wb') as file:
+            file.write(self.magic + self.get_key() + zlib.compress(self.bits.tobytes(), 9))
+        os.replace(self.path + '.tmp', self.path)
+
+
+if __name__ == '__main__':
+    from types import SimpleNamespace
+    from map import Map
+    from visibility import Visibility
+
+    game = SimpleNamespace()
+    game.map = Map(game)
+    pvs = Visibility(game).pvs
+    bits = pvs.build()
+    pvs.save()
+    pairs = sum(int(np.unpackbits(row, count=len(bits)).sum()) for row in bits)
+    print(f'{len(bits)} walkable cells, {1 - pairs / len(bits) ** 2:.0%} of cell pairs hidden, '
+          f'{os.path.getsize(pvs.path)} bytes written to {pvs.path}')
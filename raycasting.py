@@ -1,6 +1,35 @@
 import pygame as pg
+import numpy as np
 import math
 from settings import *
+from assets import surface_bytes
+from lru import LRUCache
+
+
+class WallColumnCache:
+    def __init__(self, textures, max_size=WALL_COLUMN_CACHE_SIZE):
+        self.textures = textures
+        self.columns = LRUCache(max_size, get_size=surface_bytes)
+
+    def get(self, texture, column, proj_height):
+        key = texture, column, proj_height
+        wall_column = self.columns.get(key)
+        if wall_column is None:
+            wall_column = self.columns.put(key, self.get_wall_column(texture, column, proj_height))
+        return wall_column
+
+    def get_wall_column(self, texture, column, proj_height):
+        if proj_height < HEIGHT:
+            wall_column = self.textures[texture].subsurface(column, 0, SCALE, TEXTURE_SIZE)
+            return pg.transform.scale(wall_column, (SCALE, proj_height))
+        texture_height = TEXTURE_SIZE * HEIGHT / proj_height
+        wall_column = self.textures[texture].subsurface(
+            column, HALF_TEXTURE_SIZE - texture_height // 2, SCALE, texture_height
+        )
+        return pg.transform.scale(wall_column, (SCALE, HEIGHT))
+
+    def clear(self):
+        self.columns.clear()
 
 
 class RayCasting:
@@ -8,26 +37,28 @@ class RayCasting:
         self.game = game
         self.ray_casting_result = []
         self.objects_to_render = []
+        self.sprites_to_render = []
+        self.z_buffer = np.full(NUM_RAYS, np.inf)
         self.textures = self.game.object_renderer.wall_textures
+        self.wall_columns = WallColumnCache(self.textures)
+        self.grid = np.frombuffer(self.game.map.grid, dtype=np.uint8).reshape(self.game.map.rows, self.game.map.cols)
+        self.ray_steps = np.arange(MAX_DEPTH)
+        self.ray_offsets = np.arange(NUM_RAYS) * DELTA_ANGLE
+        self.engine = self.ray_cast_numpy if RAY_CASTING_ENGINE == 'numpy' else self.ray_cast
 
     def get_objects_to_render(self):
         self.objects_to_render = []
         for ray, values in enumerate(self.ray_casting_result):
             depth, proj_height, texture, offset = values
 
+            # quantize so that columns repeat from frame to frame and can be reused
+            column = int(offset * (TEXTURE_SIZE - SCALE))
+            proj_height = max(int(proj_height) // WALL_COLUMN_HEIGHT_STEP, 1) * WALL_COLUMN_HEIGHT_STEP
+            wall_column = self.wall_columns.get(texture, column, proj_height)
+
             if proj_height < HEIGHT:
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), 0, SCALE, TEXTURE_SIZE
-                )
-                wall_column = pg.transform.scale(wall_column, (SCALE, proj_height))
                 wall_pos = (ray * SCALE, HALF_HEIGHT - proj_height // 2)
             else:
-                texture_height = TEXTURE_SIZE * HEIGHT / proj_height
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), HALF_TEXTURE_SIZE - texture_height // 2,
-                    SCALE, texture_height
-                )
-                wall_column = pg.transform.scale(wall_column, (SCALE, HEIGHT))
                 wall_pos = (ray * SCALE, 0)
 
             self.objects_to_render.append((depth, wall_column, wall_pos))
@@ -35,10 +66,12 @@ class RayCasting:
     def ray_cast(self):
         self.ray_casting_result = []
         texture_vert, texture_hor = 1, 1
-        ox, oy = self.game.player.pos
-        x_map, y_map = self.game.player.map_pos
+        ox, oy = self.game.player.view_pos
+        x_map, y_map = int(ox), int(oy)
+        player_angle = self.game.player.view_angle
+        grid, cols, rows = self.game.map.grid, self.game.map.cols, self.game.map.rows
 
-        ray_angle = self.game.player.angle - HALF_FOV + 0.0001
+        ray_angle = player_angle - HALF_FOV + 0.0001
         for ray in range(NUM_RAYS):
             sin_a = math.sin(ray_angle)
             cos_a = math.cos(ray_angle)
@@ -53,9 +86,9 @@ class RayCasting:
             dx = delta_depth * cos_a
 
             for i in range(MAX_DEPTH):
-                tile_hor = int(x_hor), int(y_hor)
-                if tile_hor in self.game.map.world_map:
-                    texture_hor = self.game.map.world_map[tile_hor]
+                x, y = int(x_hor), int(y_hor)
+                if 0 <= x < cols and 0 <= y < rows and grid[y * cols + x]:
+                    texture_hor = grid[y * cols + x]
                     break
                 x_hor += dx
                 y_hor += dy
@@ -71,9 +104,9 @@ class RayCasting:
             dy = delta_depth * sin_a
 
             for i in range(MAX_DEPTH):
-                tile_vert = int(x_vert), int(y_vert)
-                if tile_vert in self.game.map.world_map:
-                    texture_vert = self.game.map.world_map[tile_vert]
+                x, y = int(x_vert), int(y_vert)
+                if 0 <= x < cols and 0 <= y < rows and grid[y * cols + x]:
+                    texture_vert = grid[y * cols + x]
                     break
                 x_vert += dx
                 y_vert += dy
@@ -90,7 +123,7 @@ class RayCasting:
                 offset = (1 - x_hor) if sin_a > 0 else x_hor
 
             # remove fishbowl effect
-            depth *= math.cos(self.game.player.angle - ray_angle)
+            depth *= math.cos(player_angle - ray_angle)
 
             # projection
             proj_height = SCREEN_DIST / (depth + 0.0001)
@@ -100,6 +133,96 @@ class RayCasting:
 
             ray_angle += DELTA_ANGLE
 
+        self.z_buffer = np.array([depth for depth, *_ in self.ray_casting_result])
+
+    def march(self, x, y, dx, dy):
+        # tiles hit by every ray at every step, then the first wall along each ray
+        tile_x = (x[:, None] + dx[:, None] * self.ray_steps).astype(np.int32)
+        tile_y = (y[:, None] + dy[:, None] * self.ray_steps).astype(np.int32)
+        rows, cols = self.grid.shape
+        inside = (tile_x >= 0) & (tile_x < cols) & (tile_y >= 0) & (tile_y < rows)
+        tiles = np.zeros(tile_x.shape, dtype=np.uint8)
+        tiles[inside] = self.grid[tile_y[inside], tile_x[inside]]
+
+        hit = tiles > 0
+        found = hit.any(axis=1)
+        steps = np.where(found, hit.argmax(axis=1), MAX_DEPTH)
+        texture = np.where(found, tiles[np.arange(len(steps)), np.minimum(steps, MAX_DEPTH - 1)], 1)
+        return steps, texture
+
+    def ray_cast_numpy(self):
+        ox, oy = self.game.player.view_pos
+        x_map, y_map = int(ox), int(oy)
+        player_angle = self.game.player.view_angle
+
+        ray_angle = player_angle - HALF_FOV + 0.0001 + self.ray_offsets
+        sin_a = np.sin(ray_angle)
+        cos_a = np.cos(ray_angle)
+
+        # horizontals
+        y_hor = np.where(sin_a > 0, y_map + 1, y_map - 1e-6)
+        dy = np.where(sin_a > 0, 1, -1)
+
+        depth_hor = (y_hor - oy) / sin_a
+        x_hor = ox + depth_hor * cos_a
+
+        delta_depth = dy / sin_a
+        dx = delta_depth * cos_a
+
+        steps, texture_hor = self.march(x_hor, y_hor, dx, dy)
+        x_hor = x_hor + dx * steps
+        depth_hor = depth_hor + delta_depth * steps
+
+        # verticals
+        x_vert = np.where(cos_a > 0, x_map + 1, x_map - 1e-6)
+        dx = np.where(cos_a > 0, 1, -1)
+
+        depth_vert = (x_vert - ox) / cos_a
+        y_vert = oy + depth_vert * sin_a
+
+        delta_depth = dx / cos_a
+        dy = delta_depth * sin_a
+
+        steps, texture_vert = self.march(x_vert, y_vert, dx, dy)
+        y_vert = y_vert + dy * steps
+        depth_vert = depth_vert + delta_depth * steps
+
+        # depth, texture offset
+        vert = depth_vert < depth_hor
+        depth = np.where(vert, depth_vert, depth_hor)
+        texture = np.where(vert, texture_vert, texture_hor)
+        y_vert %= 1
+        x_hor %= 1
+        offset = np.where(vert,
+                          np.where(cos_a > 0, y_vert, 1 - y_vert),
+                          np.where(sin_a > 0, 1 - x_hor, x_hor))
+
+        # remove fishbowl effect
+        depth *= np.cos(player_angle - ray_angle)
+
+        # projection
+        proj_height = SCREEN_DIST / (depth + 0.0001)
+
+        # ray casting result
+        self.ray_casting_result = list(zip(depth.tolist(), proj_height.tolist(), texture.tolist(), offset.tolist()))
+        self.z_buffer = depth
+
+    def get_visible_spans(self, x, width, depth):
+        # screen x ranges of an object at this depth that are not covered by a nearer wall
+        ray_start = max(int(x) // SCALE, 0)
+        ray_end = min(-(-int(x + width) // SCALE), NUM_RAYS)
+        if ray_start >= ray_end:
+            return []
+        visible = (self.z_buffer[ray_start:ray_end] > depth).astype(np.int8)
+        edges = np.flatnonzero(np.diff(visible, prepend=0, append=0))
+        return [(max((ray_start + start) * SCALE, int(x)), min((ray_start + end) * SCALE, int(x + width)))
+                for start, end in zip(edges[::2], edges[1::2])]
+
     def update(self):
-        self.ray_cast()
-        self.get_objects_to_render()
\ No newline at end of file
+        self.engine()
+        self.sprites_to_render = []
+        if RENDERER == 'framebuffer':
+            # walls are drawn straight into the framebuffer
+            self.objects_to_render = []
+        else:
+            self.get_objects_to_render()
\ No newline at end of file
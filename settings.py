@@ -6,6 +6,8 @@ RES = WIDTH, HEIGHT = 1600, 900
 HALF_WIDTH = WIDTH // 2
 HALF_HEIGHT = HEIGHT // 2
 FPS = 0
+SIM_DELTA_TIME = 16  # milliseconds per fixed simulation step
+MAX_SIM_STEPS = 5  # per rendered frame, the rest is dropped when rendering falls behind
 
 PLAYER_POS = 1.5, 5  # mini_map
 PLAYER_ANGLE = 0
@@ -27,6 +29,31 @@ NUM_RAYS = WIDTH // 2
 HALF_NUM_RAYS = NUM_RAYS // 2
 DELTA_ANGLE = FOV / NUM_RAYS
 MAX_DEPTH = 20
+RAY_CASTING_ENGINE = 'numpy'  # 'scalar' or 'numpy'
+WALL_COLUMN_CACHE_SIZE = 4096  # pre-scaled wall columns kept between frames
+WALL_COLUMN_HEIGHT_STEP = 2  # projection height quantization in pixels
+RENDERER = 'blit'  # 'blit' or 'framebuffer'
+SPRITE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # scaled sprite frames shared by all sprites
+SPRITE_CACHE_HEIGHT_STEP = 4  # projection height quantization in pixels
+PATHFINDING_MODE = 'bfs'  # 'bfs', 'astar' or 'hpa' per agent, or 'flow_field' shared per goal cell, ignoring occupancy
+PATH_CACHE_SIZE = 1024  # (start, goal) next steps kept while npc positions are unchanged
+FLOW_FIELD_CACHE_SIZE = 8  # goal cells whose flow fields are kept
+HPA_CLUSTER_SIZE = 8  # tiles per side of a hierarchical pathfinding cluster
+HPA_CACHE_DIR = 'cache/hpa'  # precomputed cluster graphs, one file per map hash
+NPC_ENGINE = 'objects'  # 'objects' or 'arrays' (numpy state, batched updates)
+NPC_LOD = True  # update far idle npcs at a reduced rate
+LOD_ACTIVE_DIST = 8  # tiles, idle npcs closer than this update every step
+LOD_DORMANT_INTERVAL = 8  # steps between the updates of a dormant npc
+LOD_HEARING_DIST = 16  # tiles, a shot wakes idle npcs within this distance
+LOD_WAKE_TIME = 3000  # ms a shot keeps them awake
+SPATIAL_CELL_SIZE = 2  # tiles per side of a proximity index cell
+PVS_PATH = 'map.pvs'  # cell to cell visibility of the shipped map, python pvs.py rebuilds it
+LOG_BATCH_SIZE = 64  # assistant log rows written together by the logger thread
+LOG_FLUSH_INTERVAL = 2.0  # seconds a logged row may wait for its batch
+LOG_FORMAT = 'csv'  # 'csv' or 'columnar' (typed binary segments, see columnar_log.py)
+LOG_SHARD_DIR = 'logs'  # rotated log shards, each with a .json sidecar, None logs to a single file
+LOG_SHARD_ROWS = 100_000  # rows per shard
+LOG_SHARD_SECONDS = 24 * 60 * 60  # play time covered by one shard
 
 SCREEN_DIST = HALF_WIDTH / math.tan(HALF_FOV)
 SCALE = WIDTH // NUM_RAYS
@@ -13,4 +13,29 @@ class Sound:
         self.npc_shot.set_volume(0.2)
         self.player_pain = pg.mixer.Sound(self.path + 'player_pain.wav')
         self.theme = pg.mixer.music.load(self.path + 'theme.mp3')
-        pg.mixer.music.set_volume(0.3)
\ No newline at end of file
+        pg.mixer.music.set_volume(0.3)
+
+    def play_theme(self):
+        pg.mixer.music.play(-1)
+
+
+class SilentEffect:
+    def play(self, *args, **kwargs):
+        pass
+
+    def set_volume(self, value):
+        pass
+
+
+class NullSound:
+    # same interface as Sound without touching pg.mixer, for headless runs
+    def __init__(self, game):
+        self.game = game
+        self.shotgun = SilentEffect()
+        self.npc_pain = SilentEffect()
+        self.npc_death = SilentEffect()
+        self.npc_shot = SilentEffect()
+        self.player_pain = SilentEffect()
+
+    def play_theme(self):
+        pass
\ No newline at end of file
@@ -0,0 +1,93 @@
+import math
+from settings import *
+
+
+class SpatialHash:
+    """
+    Uniform grid of entities bucketed by position, for radius and k nearest queries.
+    Entities are re-bucketed by move() only when they cross into another cell.
+    """
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        # cell -> entities in insertion order, entity -> cell
+        self.cells = {}
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get_key(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, entity):
+        key = self.keys[entity] = self.get_key(entity.x, entity.y)
+        self.cells.setdefault(key, {})[entity] = None
+
+    def remove(self, entity):
+        key = self.keys.pop(entity, None)
+        if key is not None:
+            cell = self.cells[key]
+            del cell[entity]
+            if not cell:
+                del self.cells[key]
+
+    def move(self, entity):
+        if self.get_key(entity.x, entity.y) != self.keys.get(entity):
+            self.remove(entity)
+            self.insert(entity)
+
+    def query_radius(self, x, y, radius, accept=None):
+        # (entity, distance) for every entity within radius of (x, y)
+        x0, y0 = self.get_key(x - radius, y - radius)
+        x1, y1 = self.get_key(x + radius, y + radius)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells):
+            cells = [cell for (cx, cy), cell in self.cells.items() if x0 <= cx <= x1 and y0 <= cy <= y1]
+        else:
+            cells = [self.cells[key] for key in ((cx, cy) for cy in range(y0, y1 + 1) for cx in range(x0, x1 + 1))
+                     if key in self.cells]
+
+        found = []
+        for cell in cells:
+            for entity in cell:
+                distance = math.hypot(entity.x - x, entity.y - y)
+                if distance <= radius and (accept is None or accept(entity)):
+                    found.append((entity, distance))
+        return found
+
+    def nearest(self, x, y, k=1, accept=None):
+        # up to k (entity, distance) pairs closest to (x, y), searched ring by ring of cells outwards
+        size = self.cell_size
+        cx, cy = self.get_key(x, y)
+        found = []
+        seen = ring = 0
+        while seen < len(self.keys):
+            if 8 * ring > len(self.cells):
+                # the ring has more cells than are occupied, checking every entity is cheaper
+                found = [(entity, math.hypot(entity.x - x, entity.y - y)) for cell in self.cells.values()
+                         for entity in cell if accept is None or accept(entity)]
+                break
+            for key in self.get_ring(cx, cy, ring):
+                cell = self.cells.get(key)
+                if cell:
+                    seen += len(cell)
+                    found += [(entity, math.hypot(entity.x - x, entity.y - y))
+                              for entity in cell if accept is None or accept(entity)]
+            if len(found) >= k:
+                # everything outside the searched rings is at least this far away
+                reach = min(x - (cx - ring) * size, (cx + ring + 1) * size - x,
+                            y - (cy - ring) * size, (cy + ring + 1) * size - y)
+                found.sort(key=lambda item: item[1])
+                if found[k - 1][1] <= reach:
+                    break
+            ring += 1
+        found.sort(key=lambda item: item[1])
+        return found[:k]
+
+    @staticmethod
+    def get_ring(cx, cy, ring):
+        if not ring:
+            return [(cx, cy)]
+        return ([(x, cy - ring) for x in range(cx - ring, cx + ring + 1)] +
+                [(x, cy + ring) for x in range(cx - ring, cx + ring + 1)] +
+                [(cx - ring, y) for y in range(cy - ring + 1, cy + ring)] +
+                [(cx + ring, y) for y in range(cy - ring + 1, cy + ring)])
@@ -1,7 +1,25 @@
 import pygame as pg
 from settings import *
-import os
-from collections import deque
+from assets import assets, surface_bytes
+from lru import LRUCache
+
+
+class SpriteScaleCache:
+    def __init__(self, max_bytes=SPRITE_CACHE_MAX_BYTES):
+        self.images = LRUCache(max_bytes=max_bytes, get_size=surface_bytes)
+
+    def get(self, image, proj_width, proj_height):
+        key = image, proj_height
+        scaled = self.images.get(key)
+        if scaled is None:
+            scaled = self.images.put(key, pg.transform.scale(image, (proj_width, proj_height)))
+        return scaled
+
+    def clear(self):
+        self.images.clear()
+
+
+sprite_scale_cache = SpriteScaleCache()
 
 
 class SpriteObject:
@@ -10,7 +28,7 @@ class SpriteObject:
         self.game = game
         self.player = game.player
         self.x, self.y = pos
-        self.image = pg.image.load(path).convert_alpha()
+        self.image = assets.get_image(path)
         self.IMAGE_WIDTH = self.image.get_width()
         self.IMAGE_HALF_WIDTH = self.image.get_width() // 2
         self.IMAGE_RATIO = self.IMAGE_WIDTH / self.image.get_height()
@@ -21,24 +39,33 @@ class SpriteObject:
 
     def get_sprite_projection(self):
         proj = SCREEN_DIST / self.norm_dist * self.SPRITE_SCALE
-        proj_width, proj_height = proj * self.IMAGE_RATIO, proj
-
-        image = pg.transform.scale(self.image, (proj_width, proj_height))
+        # quantize so that sprites sharing a frame at similar distances share one scaled image
+        proj = max(int(proj) // SPRITE_CACHE_HEIGHT_STEP, 1) * SPRITE_CACHE_HEIGHT_STEP
+        proj_width, proj_height = int(proj * self.IMAGE_RATIO), proj
 
         self.sprite_half_width = proj_width // 2
+        pos_x = self.screen_x - self.sprite_half_width
+
+        # skip the scaling entirely when every column of the sprite is behind a wall
+        spans = self.game.raycasting.get_visible_spans(pos_x, proj_width, self.norm_dist)
+        if not spans:
+            return
+
+        image = sprite_scale_cache.get(self.image, proj_width, proj_height)
+
         height_shift = proj_height * self.SPRITE_HEIGHT_SHIFT
-        pos = self.screen_x - self.sprite_half_width, HALF_HEIGHT - proj_height // 2 + height_shift
+        pos = pos_x, HALF_HEIGHT - proj_height // 2 + height_shift
 
-        self.game.raycasting.objects_to_render.append((self.norm_dist, image, pos))
+        self.game.raycasting.sprites_to_render.append((self.norm_dist, image, pos, spans))
 
-    def get_sprite(self):
-        dx = self.x - self.player.x
-        dy = self.y - self.player.y
+    def locate(self, x, y, player_x, player_y, player_angle):
+        dx = x - player_x
+        dy = y - player_y
         self.dx, self.dy = dx, dy
         self.theta = math.atan2(dy, dx)
 
-        delta = self.theta - self.player.angle
-        if (dx > 0 and self.player.angle > math.pi) or (dx < 0 and dy < 0):
+        delta = self.theta - player_angle
+        if (dx > 0 and player_angle > math.pi) or (dx < 0 and dy < 0):
             delta += math.tau
 
         delta_rays = delta / DELTA_ANGLE
@@ -46,6 +73,16 @@ class SpriteObject:
 
         self.dist = math.hypot(dx, dy)
         self.norm_dist = self.dist * math.cos(delta)
+        # projected half width is geometry too, so hit tests work without rendering
+        if self.norm_dist > 0.5:
+            self.sprite_half_width = SCREEN_DIST / self.norm_dist * self.SPRITE_SCALE * self.IMAGE_RATIO // 2
+
+    @property
+    def view_pos(self):
+        return self.x, self.y
+
+    def get_sprite(self):
+        self.locate(*self.view_pos, *self.player.view_pos, self.player.view_angle)
         if -self.IMAGE_HALF_WIDTH < self.screen_x < (WIDTH + self.IMAGE_HALF_WIDTH) and self.norm_dist > 0.5:
             self.get_sprite_projection()
 
@@ -60,7 +97,8 @@ class AnimatedSprite(SpriteObject):
         self.animation_time = animation_time
         self.path = path.rsplit('/', 1)[0]
         self.images = self.get_images(self.path)
-        self.animation_time_prev = pg.time.get_ticks()
+        self.frame_index = 0
+        self.animation_time_prev = self.game.get_ticks()
         self.animation_trigger = False
 
     def update(self):
@@ -69,21 +107,17 @@ class AnimatedSprite(SpriteObject):
         self.animate(self.images)
 
     def animate(self, images):
+        # frames are shared between instances, so only the index is per sprite
         if self.animation_trigger:
-            images.rotate(-1)
-            self.image = images[0]
+            self.frame_index += 1
+            self.image = images[self.frame_index % len(images)]
 
     def check_animation_time(self):
         self.animation_trigger = False
-        time_now = pg.time.get_ticks()
+        time_now = self.game.get_ticks()
         if time_now - self.animation_time_prev > self.animation_time:
             self.animation_time_prev = time_now
             self.animation_trigger = True
 
     def get_images(self, path):
-        images = deque()
-        for file_name in os.listdir(path):
-            if os.path.isfile(os.path.join(path, file_name)):
-                img = pg.image.load(path + '/' + file_name).convert_alpha()
-                images.append(img)
-        return images
+        return assets.get_frames(path)
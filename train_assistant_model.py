@@ -1,22 +1,25 @@
+import argparse
+import json
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-from sklearn.model_selection import train_test_split
+import sklearn
+from sklearn.model_selection import KFold
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report
 import joblib
+import numpy as np
 import os
+from columnar_log import ColumnarLog
+from log_shards import ShardedLog, EXTENSIONS, parse_timestamps
 
-log_file = "assistant_logs.csv"
-
-if not os.path.exists(log_file):
-    print("Log file not found.")
-    exit()
-
-data = pd.read_csv(log_file)
-data.dropna(inplace=True)
-
-if data.empty:
-    print("No data found in assistant_logs.csv. Play the game with the assistant to generate data.")
-    exit()
+MODEL_FILE = "assistant_model.joblib"
+CHECKPOINT_FILE = "assistant_model.checkpoint.joblib"  # rows read per log file and replay rows of incremental training
+REPORT_FILE = "training_report.json"  # cross-validation results of the last full training
+INCREMENT_SHARE = 0.2  # share of the forest's trees replaced by each incremental update
+REPLAY_SIZE = 5000  # uniform sample of earlier rows mixed into every update
+CHUNK_ROWS = 100_000  # rows of a CSV log parsed at a time
+LATENCY_SAMPLES = 200  # single row predictions timed per fold
 
 features = [
     "player_health",
@@ -26,62 +29,358 @@ features = [
     "is_hidden"
 ]
 label = "advice"
+columns = ["timestamp"] + features + [label]
+
+
+def find_log():
+    # rotated shards take precedence over a converted or columnar log, then the CSV one;
+    # a log kept from before the rotation is imported into the shards on first use
+    legacy = next((path for path in ("assistant_logs.alog", "assistant_logs.csv") if os.path.exists(path)), None)
+    if not os.path.isdir("logs"):
+        return legacy or "assistant_logs.csv"
+    if legacy:
+        rows = ShardedLog("logs").import_once(legacy)
+        if rows:
+            print(f"{rows} rows of {legacy} imported into logs")
+    return "logs"
+
+
+def iter_chunks(log_file, start=None, end=None, chunk_rows=CHUNK_ROWS, skip=None, consumed=None):
+    # the complete rows of the [start, end) window, only the training columns, one frame per
+    # shard or columnar log and chunk_rows rows at a time of a CSV log. The first skip[name] rows
+    # of every file are left out, and consumed gets the rows of every file before its first one
+    # at or after end, which the next incremental training skips
+    skip = skip or {}
+    consumed = {} if consumed is None else consumed
+    start = start and pd.Timestamp(start)
+    end = end and pd.Timestamp(end)
+    if os.path.isdir(log_file):
+        # rows past the manifest's count may still be being written
+        sources = [(shard, os.path.join(log_file, shard["file"])) for shard in ShardedLog(log_file).load_manifest()["shards"]]
+    else:
+        sources = [({"file": os.path.basename(log_file), "rows": None}, log_file)]
+    for shard, path in sources:
+        name, last = shard["file"], shard["rows"]
+        first = skip.get(name, 0)
+        replaces = shard.get("replaces", {})
+        if name not in skip and replaces and all(skip.get(old, 0) >= rows for old, rows in replaces.items()):
+            # merged by a compaction from shards that were read to the end
+            first = last
+        if end is not None and "start" in shard and pd.Timestamp(shard["start"]) >= end:
+            if name in skip:
+                consumed[name] = first
+            continue
+        if last is not None and (first >= last or start is not None and pd.Timestamp(shard["end"]) < start):
+            consumed[name] = max(first, last)
+            continue
+        if path.endswith(EXTENSIONS["columnar"]):
+            chunks = [ColumnarLog(path).read_frame(columns).iloc[first:last].reset_index(drop=True)]
+        else:
+            chunks = pd.read_csv(path, usecols=columns, chunksize=chunk_rows, skiprows=range(1, first + 1),
+                                 nrows=None if last is None else last - first)
+        position, stop = first, None
+        for chunk in chunks:
+            rows = len(chunk)
+            chunk["timestamp"] = parse_timestamps(chunk["timestamp"], path)
+            chunk[label] = normalize_advice(chunk[label])
+            if end is not None:
+                later = (chunk["timestamp"] >= end).to_numpy()
+                if stop is None and later.any():
+                    stop = position + int(later.argmax())
+                chunk = chunk[~later]
+            position += rows
+            if start is not None:
+                chunk = chunk[chunk["timestamp"] >= start]
+            yield chunk.dropna()
+        consumed[name] = position if stop is None else stop
+
+
+def normalize_advice(advice):
+    # distances in whole units, or nearly every tenth of a unit would be an advice class of its own
+    return advice.str.replace(r"\d+\.\d+", lambda match: f"{float(match.group()):.0f}", regex=True)
+
+
+def read_logs(log_file, start=None, end=None, chunk_rows=CHUNK_ROWS, skip=None, consumed=None):
+    chunks = list(iter_chunks(log_file, start, end, chunk_rows, skip, consumed))
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def get_xy(data):
+    # plain arrays, as the assistant predicts from plain lists
+    return data[features].to_numpy(dtype=np.float64), data[label].to_numpy()
+
+
+def save_checkpoint(data, consumed, checkpoint=None, checkpoint_file=CHECKPOINT_FILE, params=None,
+                    max_latency_ms=None):
+    # the rows read of every log file and a uniform sample of all rows so far, extended by the new rows
+    # in data, and the candidate the full training chose with its latency budget
+    rows = data[features + [label]]
+    if checkpoint is None:
+        checkpoint = {"rows_seen": 0, "replay": rows.iloc[:0], "params": params, "max_latency_ms": max_latency_ms}
+    checkpoint = {
+        "consumed": consumed,
+        "rows_seen": checkpoint["rows_seen"] + len(rows),
+        "replay": update_replay(checkpoint["replay"], rows, checkpoint["rows_seen"]),
+        "params": checkpoint.get("params"),
+        "max_latency_ms": checkpoint.get("max_latency_ms"),
+    }
+    joblib.dump(checkpoint, checkpoint_file + ".tmp")
+    os.replace(checkpoint_file + ".tmp", checkpoint_file)
+
+
+def update_replay(replay, rows, rows_seen, rng=np.random.default_rng()):
+    # reservoir sampling: every row seen so far stays in the replay with the same probability
+    space = max(REPLAY_SIZE - len(replay), 0)
+    replay = pd.concat([replay, rows.iloc[:space]], ignore_index=True)
+    rows = rows.iloc[space:]
+    seen = rows_seen + space + np.arange(1, len(rows) + 1)
+    slots = (rng.random(len(rows)) * seen).astype(np.int64)
+    taken = np.flatnonzero(slots < REPLAY_SIZE)
+    # of the rows drawn for the same slot the last one stays
+    _, last = np.unique(slots[taken][::-1], return_index=True)
+    taken = taken[len(taken) - 1 - last]
+    kept = np.setdiff1d(np.arange(len(replay)), slots[taken])
+    return pd.concat([replay.iloc[kept], rows.iloc[taken]], ignore_index=True)
+
+
+def make_candidates(trees=(100,), depths=(None,)):
+    return [{"n_estimators": n, "max_depth": depth} for n in trees for depth in depths]
+
+
+# the rows each worker process cross-validates on, sent once per worker instead of once per fold
+worker_data = None
+
 
-X = data[features]
-y = data[label]
+def set_worker_data(X, y):
+    global worker_data
+    worker_data = X, y
 
-if len(X) < 2:
-    print("Not enough data to train a model. Need at least 2 rows.")
-    exit()
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+def evaluate_fold(params, train_index, test_index):
+    X, y = worker_data
+    model = RandomForestClassifier(random_state=42, n_jobs=1, **params)
+    started = time.perf_counter()
+    model.fit(X[train_index], y[train_index])
+    fit_seconds = time.perf_counter() - started
+    accuracy = float((model.predict(X[test_index]) == y[test_index]).mean())
+    return {"fit_seconds": fit_seconds, "accuracy": accuracy, "predict_ms": measure_latency(model, X[test_index]),
+            "model_bytes": len(pickle.dumps(model))}
 
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
 
-y_pred = model.predict(X_test)
-print("\nClassification Report:")
-print(classification_report(y_test, y_pred))
+def measure_latency(model, X):
+    # milliseconds per prediction of one row at a time, as the frame loop asks for advice
+    latencies = []
+    for row in X[:LATENCY_SAMPLES].tolist():
+        started = time.perf_counter()
+        model.predict([row])
+        latencies.append(time.perf_counter() - started)
+    return np.array(latencies) * 1000
 
-joblib.dump(model, "assistant_model.joblib")
-print("\nModel saved as assistant_model.joblib")
 
-def retrain_model(log_file="assistant_logs.csv"):
+def cross_validate(X, y, candidates, folds=5, jobs=None):
+    # every fold of every candidate is a task of the process pool, each fits on one core
+    splits = list(KFold(folds, shuffle=True, random_state=42).split(X))
+    with ProcessPoolExecutor(jobs, initializer=set_worker_data, initargs=(X, y)) as pool:
+        tasks = [[pool.submit(evaluate_fold, params, train_index, test_index) for train_index, test_index in splits]
+                 for params in candidates]
+        scores = [[task.result() for task in candidate_tasks] for candidate_tasks in tasks]
+
+    results = []
+    for params, folds_scores in zip(candidates, scores):
+        accuracy = [score["accuracy"] for score in folds_scores]
+        latencies = np.concatenate([score["predict_ms"] for score in folds_scores])
+        results.append({
+            "params": params,
+            "accuracy": float(np.mean(accuracy)),
+            "accuracy_std": float(np.std(accuracy)),
+            "fit_seconds": float(np.mean([score["fit_seconds"] for score in folds_scores])),
+            "predict_ms_p50": float(np.percentile(latencies, 50)),
+            "predict_ms_p95": float(np.percentile(latencies, 95)),
+            "model_bytes": int(np.mean([score["model_bytes"] for score in folds_scores])),
+        })
+    return results
+
+
+def choose(results, max_latency_ms=None):
+    # the most accurate candidate within the latency budget, else the fastest one
+    within = [result for result in results
+              if max_latency_ms is None or result["predict_ms_p95"] <= max_latency_ms]
+    if not within:
+        return min(results, key=lambda result: result["predict_ms_p95"])
+    return max(within, key=lambda result: (result["accuracy"], -result["predict_ms_p95"]))
+
+
+def retrain_model(log_file=None, start=None, end=None, candidates=None, folds=5, jobs=None,
+                  max_latency_ms=None, chunk_rows=CHUNK_ROWS, model_file=MODEL_FILE, report_file=REPORT_FILE):
+    # cross-validates the candidates, fits the chosen one on every row and saves it with a checkpoint
+    log_file = log_file or find_log()
     if not os.path.exists(log_file):
         print("Log file not found.")
         return
 
-    data = pd.read_csv(log_file)
-    data.dropna(inplace=True)
-
+    started = time.perf_counter()
+    consumed = {}
+    data = read_logs(log_file, start, end, chunk_rows, consumed=consumed)
+    read_seconds = time.perf_counter() - started
     if data.empty:
-        print("No data found in assistant_logs.csv.")
+        print(f"No data found in {log_file}. Play the game with the assistant to generate data.")
+        return
+    if len(data) < max(folds, 2):
+        print(f"Not enough data to train a model. Need at least {max(folds, 2)} rows.")
+        return
+
+    X, y = get_xy(data)
+    candidates = candidates or make_candidates()
+    started = time.perf_counter()
+    results = cross_validate(X, y, candidates, folds, jobs)
+    cv_seconds = time.perf_counter() - started
+    best = choose(results, max_latency_ms)
+
+    print(f"\n{len(data)} rows, {folds}-fold cross-validation in {cv_seconds:.1f} s")
+    for result in results:
+        marker = "*" if result is best else " "
+        print(f"{marker} {result['params']}: accuracy {result['accuracy']:.3f} ± {result['accuracy_std']:.3f}, "
+              f"fit {result['fit_seconds']:.2f} s, predict {result['predict_ms_p50']:.2f} ms "
+              f"(p95 {result['predict_ms_p95']:.2f} ms), {result['model_bytes'] / 1e6:.1f} MB")
+    if max_latency_ms is not None and best["predict_ms_p95"] > max_latency_ms:
+        print(f"No candidate predicts within {max_latency_ms} ms, the fastest one was chosen.")
+
+    started = time.perf_counter()
+    model = RandomForestClassifier(random_state=42, n_jobs=jobs or -1, **best["params"])
+    model.fit(X, y)
+    fit_seconds = time.perf_counter() - started
+    # single rows predict faster without spreading the trees over worker threads
+    model.set_params(n_jobs=None)
+    joblib.dump(model, model_file)
+    save_checkpoint(data, consumed, params=best["params"], max_latency_ms=max_latency_ms)
+
+    report = {
+        "log": log_file,
+        "start": start,
+        "end": end,
+        "rows": len(data),
+        "folds": folds,
+        "jobs": jobs or os.cpu_count(),
+        "max_latency_ms": max_latency_ms,
+        "read_seconds": read_seconds,
+        "cv_seconds": cv_seconds,
+        "final_fit_seconds": fit_seconds,
+        "candidates": results,
+        "chosen": best["params"],
+    }
+    if report_file:
+        with open(report_file, "w") as file:
+            json.dump(report, file, indent=1)
+    print(f"\nModel saved as {model_file}" + (f", report written to {report_file}" if report_file else ""))
+    return report
+
+
+def widen_trees(model, classes, X):
+    # spreads the class columns of every tree over classes, a superset of the model's classes,
+    # so trees fitted on different advice can vote in one forest. This rebuilds scikit-learn's
+    # tree state, so the probabilities on the rows X are checked to be the same afterwards
+    if np.array_equal(classes, model.classes_):
         return
+    columns = np.searchsorted(classes, model.classes_)
+    before = model.predict_proba(X)
+    for tree in model.estimators_:
+        tree_class, (n_features, _, n_outputs), state = tree.tree_.__reduce__()
+        values = np.zeros(state["values"].shape[:2] + (len(classes),))
+        values[:, :, columns] = state["values"]
+        tree.tree_ = tree_class(n_features, np.array([len(classes)], dtype=np.intp), n_outputs)
+        tree.tree_.__setstate__({**state, "values": values})
+        tree.n_classes_ = len(classes)
+        tree.classes_ = np.arange(len(classes), dtype=np.float64)
+    model.classes_ = classes
+    model.n_classes_ = len(classes)
+    after = model.predict_proba(X)
+    if not (np.allclose(after[:, columns], before) and np.allclose(np.delete(after, columns, axis=1), 0)):
+        raise RuntimeError("widened trees predict differently")
 
-    features = [
-        "player_health",
-        "threat_count",
-        "closest_enemy_distance",
-        "in_fov",
-        "is_hidden"
-    ]
-    label = "advice"
 
-    X = data[features]
-    y = data[label]
+def incremental_retrain(log_file=None, model_file=MODEL_FILE, checkpoint_file=CHECKPOINT_FILE, jobs=None):
+    # trains new trees only on the rows of every log file past those read by the last training, mixed
+    # with the replay rows, in place of the forest's oldest ones; advice the forest has not seen widens its classes.
+    # The forest keeps the size and parameters of the candidate the full training chose
+    log_file = log_file or find_log()
+    if not (os.path.exists(model_file) and os.path.exists(checkpoint_file)):
+        print("No checkpoint found, run a full training first.")
+        return
+    model = joblib.load(model_file)
+    checkpoint = joblib.load(checkpoint_file)
+    if "consumed" not in checkpoint:
+        print("The checkpoint predates per file tracking, run a full training first.")
+        return
 
-    if len(X) < 2:
-        print("Not enough data to retrain the model.")
+    consumed = {}
+    data = read_logs(log_file, skip=checkpoint["consumed"], consumed=consumed)
+    if data.empty:
+        print("No rows logged since the last training.")
         return
+    score = model.score(*get_xy(data))
+
+    size = (checkpoint.get("params") or {}).get("n_estimators", model.n_estimators)
+    added = max(1, round(size * INCREMENT_SHARE))
+    train = pd.concat([data[features + [label]], checkpoint["replay"]])
+    new_trees = RandomForestClassifier(**{**model.get_params(), "n_estimators": added,
+                                          "warm_start": False, "n_jobs": jobs or -1})
+    new_trees.fit(*get_xy(train))
+    classes = np.union1d(model.classes_, new_trees.classes_)
+    new_advice = len(classes) - len(model.classes_)
+    X = get_xy(data)[0][:LATENCY_SAMPLES]
+    try:
+        widen_trees(model, classes, X)
+        widen_trees(new_trees, classes, X)
+    except Exception as error:
+        # the saved model is left as it was
+        print(f"Could not add new advice to the forest with scikit-learn {sklearn.__version__} ({error!r}), "
+              f"run a full training.")
+        return
+    model.estimators_ = (model.estimators_ + new_trees.estimators_)[-size:]
+    model.set_params(n_estimators=len(model.estimators_))
+    latency = measure_latency(model, get_xy(data)[0])
+
+    joblib.dump(model, model_file)
+    save_checkpoint(data, consumed, checkpoint, checkpoint_file)
+    print(f"{len(data)} new rows, accuracy on them before the update {score:.2f}")
+    print(f"{added} trees added, {new_advice} new advice, {len(model.estimators_)} trees, "
+          f"{len(train)} rows trained on")
+    print(f"Single row predict {np.percentile(latency, 50):.2f} ms (p95 {np.percentile(latency, 95):.2f} ms)")
+    max_latency_ms = checkpoint.get("max_latency_ms")
+    if max_latency_ms is not None and np.percentile(latency, 95) > max_latency_ms:
+        print(f"Over the {max_latency_ms} ms budget of the last full training, run a full training to choose again.")
+    print(f"\nModel updated and saved as {model_file}")
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
+def main():
+    parser = argparse.ArgumentParser(description="Train the assistant model on the assistant logs")
+    parser.add_argument("--log", help="shard directory, columnar or CSV log (default: logs, "
+                                      "assistant_logs.alog or assistant_logs.csv, the first that exists)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only learn from the rows logged since the last training")
+    parser.add_argument("--start", help="first timestamp of the rows to train on, ISO format")
+    parser.add_argument("--end", help="timestamp the rows to train on end before, ISO format")
+    parser.add_argument("--trees", type=int, nargs="+", default=[100], help="forest sizes to try")
+    parser.add_argument("--depth", type=lambda text: None if text == "none" else int(text), nargs="+",
+                        default=[None], help="maximum tree depths to try, none for unlimited")
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds")
+    parser.add_argument("--jobs", type=int, help="worker processes and training threads (default: all cores)")
+    parser.add_argument("--max-latency-ms", type=float,
+                        help="only choose among candidates whose p95 single row prediction is this fast")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows of a CSV log parsed at a time")
+    parser.add_argument("--report", default=REPORT_FILE, help="JSON report path, empty for none")
+    args = parser.parse_args()
+    if args.folds < 2:
+        parser.error("--folds must be at least 2")
+
+    if args.incremental:
+        incremental_retrain(args.log, jobs=args.jobs)
+        return
+    retrain_model(args.log, args.start, args.end, make_candidates(args.trees, args.depth), args.folds, args.jobs,
+                  args.max_latency_ms, args.chunk_rows, report_file=args.report)
 
-    y_pred = model.predict(X_test)
-    print("\nClassification Report:")
-    print(classification_report(y_test, y_pred))
 
-    joblib.dump(model, "assistant_model.joblib")
-    print("\nModel retrained and saved as assistant_model.joblib")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import numpy as np
+from settings import *
+from pvs import PotentiallyVisibleSet
+
+
+class Visibility:
+    """
+    Player to npc line of sight, cast for every live npc at once each simulation step.
+    NPC logic, the assistant and its radar all read the results from here.
+    """
+    def __init__(self, game):
+        self.game = game
+        self.grid = np.frombuffer(game.map.grid, dtype=np.uint8).reshape(game.map.rows, game.map.cols)
+        self.ray_steps = np.arange(MAX_DEPTH)
+        self.visible = {}
+        self.pvs = PotentiallyVisibleSet(self)
+
+    def update(self):
+        if self.game.object_handler.npc_engine:
+            # the array engine casts its own batch from its position arrays
+            return
+        npcs = [npc for npc in self.game.object_handler.scheduler.awake if npc.alive]
+        self.visible = dict(zip(npcs, self.cast(npcs).tolist()))
+
+    def is_visible(self, entity):
+        visible = self.visible.get(entity)
+        if visible is None:
+            visible = self.visible[entity] = bool(self.cast([entity])[0])
+        return visible
+
+    def march(self, x, y, dx, dy, target_x, target_y):
+        # steps to the first target tile and to the first wall along each ray, MAX_DEPTH if none
+        rows, cols = self.grid.shape
+        tile_x = np.clip(x[:, None] + dx[:, None] * self.ray_steps, -1, cols).astype(np.int32)
+        tile_y = np.clip(y[:, None] + dy[:, None] * self.ray_steps, -1, rows).astype(np.int32)
+        inside = (tile_x >= 0) & (tile_x < cols) & (tile_y >= 0) & (tile_y < rows)
+        tiles = np.zeros(tile_x.shape, dtype=np.uint8)
+        tiles[inside] = self.grid[tile_y[inside], tile_x[inside]]
+
+        target = (tile_x == target_x[:, None]) & (tile_y == target_y[:, None])
+        wall = tiles > 0
+        target_step = np.where(target.any(axis=1), target.argmax(axis=1), MAX_DEPTH)
+        wall_step = np.where(wall.any(axis=1), wall.argmax(axis=1), MAX_DEPTH)
+        return target_step, wall_step
+
+    def cast(self, entities):
+        x = np.array([entity.x for entity in entities], dtype=np.float64)
+        y = np.array([entity.y for entity in entities], dtype=np.float64)
+        return self.cast_points(x, y)
+
+    def cast_points(self, x, y):
+        ox, oy = self.game.player.pos
+        candidates = self.pvs.may_see(int(ox), int(oy), x.astype(np.int32), y.astype(np.int32))
+        if candidates is None:
+            return self.cast_rays(ox, oy, x, y)
+        # only the cells the player's cell can possibly see need the exact test
+        visible = np.zeros(len(x), dtype=bool)
+        visible[candidates] = self.cast_rays(ox, oy, x[candidates], y[candidates])
+        return visible
+
+    def cast_rays(self, ox, oy, x, y):
+        # the same two-axis DDA as the wall ray caster, one ray from (ox, oy) to each (x, y):
+        # visible when the ray enters the target tile before it hits a wall
+        x_map, y_map = np.floor(ox).astype(np.int32), np.floor(oy).astype(np.int32)
+        target_x, target_y = x.astype(np.int32), y.astype(np.int32)
+
+        ray_angle = np.arctan2(y - oy, x - ox)
+        sin_a = np.sin(ray_angle)
+        cos_a = np.cos(ray_angle)
+        sin_a[sin_a == 0] = 1e-9
+        cos_a[cos_a == 0] = 1e-9
+
+        # horizontals
+        y_hor = np.where(sin_a > 0, y_map + 1, y_map - 1e-6)
+        dy = np.where(sin_a > 0, 1, -1)
+
+        depth_hor = (y_hor - oy) / sin_a
+        x_hor = ox + depth_hor * cos_a
+
+        delta_depth = dy / sin_a
+        dx = delta_depth * cos_a
+
+        target_step, wall_step = self.march(x_hor, y_hor, dx, dy, target_x, target_y)
+        target_dist_h = np.where(target_step < wall_step, depth_hor + delta_depth * target_step, 0)
+        wall_dist_h = np.where(wall_step < target_step, depth_hor + delta_depth * wall_step, 0)
+
+        # verticals
+        x_vert = np.where(cos_a > 0, x_map + 1, x_map - 1e-6)
+        dx = np.where(cos_a > 0, 1, -1)
+
+        depth_vert = (x_vert - ox) / cos_a
+        y_vert = oy + depth_vert * sin_a
+
+        delta_depth = dx / cos_a
+        dy = delta_depth * sin_a
+
+        target_step, wall_step = self.march(x_vert, y_vert, dx, dy, target_x, target_y)
+        target_dist_v = np.where(target_step < wall_step, depth_vert + delta_depth * target_step, 0)
+        wall_dist_v = np.where(wall_step < target_step, depth_vert + delta_depth * wall_step, 0)
+
+        target_dist = np.maximum(target_dist_h, target_dist_v)
+        wall_dist = np.maximum(wall_dist_h, wall_dist_v)
+        same_tile = (target_x == x_map) & (target_y == y_map)
+        return same_tile | ((0 < target_dist) & (target_dist < wall_dist)) | (wall_dist == 0)